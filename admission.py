@@ -0,0 +1,209 @@
+import heapq
+import itertools
+import json
+import math
+import threading
+import time
+
+# 准入控制与过载保护：限制同时处理的请求数，超出部分在有界队列中按优先级等待，
+# 队列已满或等待超时时立即返回503；另按客户端做令牌桶限流，超出时返回429
+
+# 队列优先级：数值越小越先获得处理槽位
+PRIORITY_CHEAP = 0
+PRIORITY_EXPENSIVE = 1
+
+
+class AdmissionController:
+    """并发槽位 + 有界优先级等待队列
+
+    廉价请求除了共享max_concurrent个槽位外，还可以使用额外的reserved个预留槽位，
+    保证昂贵查询占满槽位时健康检查和列表请求仍能及时返回。
+    """
+
+    def __init__(self, max_concurrent=32, max_queue=64, queue_timeout=5.0, reserved=4):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.reserved = reserved
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    def configure(self, max_concurrent=None, max_queue=None, queue_timeout=None, reserved=None):
+        with self._cond:
+            if max_concurrent is not None:
+                self.max_concurrent = max(int(max_concurrent), 1)
+            if max_queue is not None:
+                self.max_queue = max(int(max_queue), 0)
+            if queue_timeout is not None:
+                self.queue_timeout = max(float(queue_timeout), 0.0)
+            if reserved is not None:
+                self.reserved = max(int(reserved), 0)
+            self._cond.notify_all()
+
+    def _limit(self, priority):
+        return self.max_concurrent + (self.reserved if priority == PRIORITY_CHEAP else 0)
+
+    def acquire(self, priority):
+        """获得处理槽位返回True；队列已满或等待超时返回False"""
+        with self._cond:
+            # 同优先级或更高优先级已有请求在排队时不插队
+            if self._active < self._limit(priority) and not any(w[0] <= priority for w in self._waiters):
+                self._active += 1
+                self.admitted += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                self.shed += 1
+                return False
+
+            waiter = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, waiter)
+            self.queued += 1
+            deadline = time.monotonic() + self.queue_timeout
+            while True:
+                if self._waiters[0] == waiter and self._active < self._limit(priority):
+                    heapq.heappop(self._waiters)
+                    self._active += 1
+                    self.admitted += 1
+                    # 队首变化后唤醒其他等待者重新检查
+                    self._cond.notify_all()
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiters.remove(waiter)
+                    heapq.heapify(self._waiters)
+                    self.timed_out += 1
+                    self._cond.notify_all()
+                    return False
+                self._cond.wait(remaining)
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def retry_after(self):
+        """建议客户端的重试间隔（秒）"""
+        return max(int(math.ceil(self.queue_timeout)), 1)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'active': self._active,
+                'waiting': len(self._waiters),
+                'max_concurrent': self.max_concurrent,
+                'reserved': self.reserved,
+                'max_queue': self.max_queue,
+                'queue_timeout': self.queue_timeout,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'shed': self.shed,
+                'timed_out': self.timed_out
+            }
+
+
+class TokenBucketLimiter:
+    """按客户端的令牌桶限流；rate<=0时不限流"""
+
+    def __init__(self, rate=0.0, burst=20, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def configure(self, rate=None, burst=None):
+        with self._lock:
+            if rate is not None:
+                self.rate = max(float(rate), 0.0)
+            if burst is not None:
+                self.burst = max(float(burst), 1.0)
+            self._buckets = {}
+
+    def consume(self, client, cost=1):
+        """
+        扣除cost个令牌，返回0表示放行，否则返回需要等待的秒数
+
+        cost超过桶容量时只要求桶是满的，放行后令牌记为负数，之后的请求要等到欠下的令牌补回，
+        长期速率仍不超过rate
+        """
+        if self.rate <= 0 or cost <= 0:
+            return 0
+        required = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= required:
+                self._buckets[client] = (tokens - cost, now)
+                if len(self._buckets) > self.max_clients:
+                    self._prune(now)
+                return 0
+            self._buckets[client] = (tokens, now)
+            self.limited += 1
+            return (required - tokens) / self.rate
+
+    def _prune(self, now):
+        # 令牌已回满的客户端与新客户端等价，可以直接丢弃；令牌为负数的客户端要补回欠下的部分才算回满
+        self._buckets = {client: (tokens, updated) for client, (tokens, updated) in self._buckets.items()
+                         if tokens + (now - updated) * self.rate < self.burst}
+
+    def stats(self):
+        with self._lock:
+            return {'rate': self.rate, 'burst': self.burst, 'clients': len(self._buckets), 'limited': self.limited}
+
+
+class AdmissionMiddleware:
+    """WSGI中间件：先做客户端限流，再申请处理槽位，拿不到槽位时快速返回503
+
+    classify(path) 返回 PRIORITY_CHEAP 或 PRIORITY_EXPENSIVE，返回None表示不受准入控制（如长连接）。
+    廉价请求不计入客户端限流。Flask在返回响应对象前已完成查询和序列化，因此下层应用返回后即释放槽位。
+    """
+
+    def __init__(self, wsgi_app, controller, limiter, classify, logger):
+        self.wsgi_app = wsgi_app
+        self.controller = controller
+        self.limiter = limiter
+        self.classify = classify
+        self.logger = logger
+
+    def _reject(self, start_response, status, retry_after, error):
+        body = json.dumps({'success': False, 'error': error}, ensure_ascii=False).encode('utf-8')
+        start_response(status, [
+            ('Content-Type', 'application/json; charset=utf-8'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', str(max(int(math.ceil(retry_after)), 1)))
+        ])
+        return [body]
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        priority = self.classify(path)
+        if priority is None:
+            return self.wsgi_app(environ, start_response)
+
+        if priority != PRIORITY_CHEAP and self.limiter.enabled:
+            wait = self.limiter.consume(environ.get('REMOTE_ADDR', ''))
+            if wait:
+                self.logger.warning(f"客户端请求过于频繁: {environ.get('REMOTE_ADDR', '')} {path}")
+                return self._reject(start_response, '429 Too Many Requests', wait, '请求过于频繁，请稍后重试')
+
+        if not self.controller.acquire(priority):
+            self.logger.warning(f"服务器繁忙，拒绝请求: {path}")
+            return self._reject(start_response, '503 Service Unavailable',
+                                self.controller.retry_after(), '服务器繁忙，请稍后重试')
+
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            self.controller.release()
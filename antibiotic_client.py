@@ -0,0 +1,416 @@
+import asyncio
+import http.client
+import json
+import queue
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+# 抗菌谱查询服务的Python客户端：与服务端API一一对应，
+# 复用长连接、按ETag重新验证本地缓存（数据版本变化时整体失效），并把多个查询合并为批量请求。
+# 只依赖标准库；AsyncAntibioticClient为asyncio版本，会自动合并同一时间窗口内的并发查询
+
+# 服务端单次批量查询的子请求上限（与app.py的BATCH_MAX_REQUESTS默认值一致）
+DEFAULT_MAX_BATCH = 50
+
+
+class ApiError(Exception):
+    """服务端返回错误（HTTP状态码>=400或success为false）"""
+
+    def __init__(self, status, message, body=None):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+        self.body = body
+
+
+class ConnectionPool:
+    """线程安全的HTTP长连接池；服务端关闭连接或连接失效时自动丢弃"""
+
+    def __init__(self, base_url, max_size=10, timeout=30):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.scheme = parsed.scheme or 'http'
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.prefix = parsed.path.rstrip('/')
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(max_size)
+
+    def _new_connection(self):
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        """发送请求并读取完整响应，返回 (状态码, 响应头字典, 响应体bytes)"""
+        headers = dict(headers or {})
+        for attempt in range(2):
+            try:
+                conn = self._idle.get_nowait()
+                reused = True
+            except queue.Empty:
+                conn = self._new_connection()
+                reused = False
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                    http.client.CannotSendRequest, http.client.BadStatusLine):
+                conn.close()
+                # 空闲连接可能已被服务端关闭，换一个新连接重试一次
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                try:
+                    self._idle.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+            return response.status, {key.lower(): value for key, value in response.getheaders()}, data
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class ResponseCache:
+    """按 (路径, 参数) 缓存响应体和ETag的LRU缓存；数据版本变化时整体清空"""
+
+    def __init__(self, max_size=512, ttl=0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.data_version = None
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path, params):
+        return path, tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                                  for name, value in (params or {}).items()))
+
+    def get(self, key):
+        """返回 (ETag, 响应体, 是否在ttl内仍新鲜)，没有缓存时返回None"""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            self._items.move_to_end(key)
+            etag, body, stored_at = entry
+            return etag, body, self.ttl > 0 and time.monotonic() - stored_at < self.ttl
+
+    def set(self, key, etag, body):
+        if self.max_size <= 0 or not etag:
+            return
+        with self._lock:
+            self._items[key] = (etag, body, time.monotonic())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def touch(self, key):
+        """304后刷新条目的新鲜时间"""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                self._items[key] = (entry[0], entry[1], time.monotonic())
+
+    def observe_version(self, data_version):
+        """响应中的数据版本与缓存的不同时清空缓存"""
+        if not data_version:
+            return
+        with self._lock:
+            if data_version != self.data_version:
+                self._items.clear()
+                self.data_version = data_version
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+def _without_none(**params):
+    return {name: value for name, value in params.items() if value is not None}
+
+
+def _compare_params(names, diff_only, transpose, format):
+    return _without_none(name=list(names), format=format,
+                         diff_only='true' if diff_only else None, transpose='true' if transpose else None)
+
+
+def _check(status, body):
+    if status >= 400 or (isinstance(body, dict) and body.get('success') is False):
+        message = body.get('error') if isinstance(body, dict) else None
+        raise ApiError(status, message or f"HTTP {status}", body)
+    return body
+
+
+class AntibioticClient:
+    """同步客户端
+
+    cache_ttl>0时，ttl内的缓存直接使用而不访问服务端；否则每次都用If-None-Match重新验证，
+    内容未变时服务端只返回304。指定site时所有查询都带上该院区参数，返回叠加院区覆盖层后的结论。
+    """
+
+    def __init__(self, base_url='http://127.0.0.1:5000', pool_size=10, timeout=30,
+                 cache_size=512, cache_ttl=0, max_batch=DEFAULT_MAX_BATCH, site=None):
+        self.pool = ConnectionPool(base_url, pool_size, timeout)
+        self.cache = ResponseCache(cache_size, cache_ttl)
+        self.max_batch = max_batch
+        self.site = site
+
+    def close(self):
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # 底层请求
+
+    def get(self, path, **params):
+        """GET一个只读API，返回解析后的JSON；错误时抛出ApiError"""
+        params = _without_none(**{'site': self.site, **params})
+        key = ResponseCache.key(path, params)
+        cached = self.cache.get(key)
+        if cached is not None and cached[2]:
+            return cached[1]
+        return self._fetch(path, params, key, cached[0] if cached is not None else None)
+
+    def _fetch(self, path, params, key, etag):
+        headers = {'Accept': 'application/json'}
+        if etag:
+            headers['If-None-Match'] = etag
+        query = urllib.parse.urlencode(params, doseq=True)
+        status, response_headers, data = self.pool.request('GET', f"{path}?{query}" if query else path,
+                                                           headers=headers)
+        self.cache.observe_version(response_headers.get('x-data-version'))
+        if status == 304:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache.touch(key)
+                return cached[1]
+            # 数据版本恰好在此时变化导致缓存被清空，不带条件重新请求
+            return self._fetch(path, params, key, None)
+
+        body = json.loads(data.decode('utf-8')) if data else None
+        _check(status, body)
+        self.cache.set(key, response_headers.get('etag'), body)
+        return body
+
+    def batch(self, calls):
+        """批量执行多个GET查询：calls为 [(路径, 参数字典)]，按顺序返回响应体或ApiError实例
+
+        ttl内新鲜的缓存不发送；其余的按max_batch分组，每组一个 /api/batch 请求，并带上已有的ETag。
+        """
+        results = [None] * len(calls)
+        pending = []
+        for index, (path, params) in enumerate(calls):
+            params = _without_none(**{'site': self.site, **(params or {})})
+            key = ResponseCache.key(path, params)
+            cached = self.cache.get(key)
+            if cached is not None and cached[2]:
+                results[index] = cached[1]
+                continue
+            item = {'path': path, 'params': params}
+            if cached is not None:
+                item['etag'] = cached[0]
+            pending.append((index, key, item))
+
+        # 批量请求本身也带上院区参数，使返回的数据版本与单个查询一致
+        batch_path = f"/api/batch?{urllib.parse.urlencode({'site': self.site})}" if self.site else '/api/batch'
+        for start in range(0, len(pending), self.max_batch):
+            group = pending[start:start + self.max_batch]
+            payload = json.dumps({'requests': [item for _, _, item in group]}, ensure_ascii=False).encode('utf-8')
+            status, response_headers, data = self.pool.request(
+                'POST', batch_path, body=payload,
+                headers={'Content-Type': 'application/json', 'Accept': 'application/json'})
+            body = _check(status, json.loads(data.decode('utf-8')) if data else None)
+            self.cache.observe_version(body.get('data_version') or response_headers.get('x-data-version'))
+
+            for (index, key, item), response in zip(group, body['responses']):
+                if response['status'] == 304:
+                    cached = self.cache.get(key)
+                    if cached is not None:
+                        self.cache.touch(key)
+                        results[index] = cached[1]
+                    else:
+                        results[index] = self._batch_fallback(item)
+                    continue
+                try:
+                    results[index] = _check(response['status'], response.get('body'))
+                    self.cache.set(key, response.get('etag'), results[index])
+                except ApiError as e:
+                    results[index] = e
+        return results
+
+    def _batch_fallback(self, item):
+        try:
+            key = ResponseCache.key(item['path'], item['params'])
+            return self._fetch(item['path'], item['params'], key, None)
+        except ApiError as e:
+            return e
+
+    # 与服务端API对应的方法
+
+    def health(self):
+        return self.get('/api/health')
+
+    def bacteria(self):
+        return self.get('/api/bacteria')['bacteria']
+
+    def drugs(self):
+        return self.get('/api/drugs')['drugs']
+
+    def bacteria_detail(self, bacteria_id):
+        return self.get(f'/api/bacteria/{int(bacteria_id)}')
+
+    def drug_detail(self, drug_id):
+        return self.get(f'/api/drug/{int(drug_id)}')
+
+    def search_bacteria(self, name):
+        return self.get('/api/search/bacteria', name=name)
+
+    def search_drug(self, name):
+        return self.get('/api/search/drug', name=name)
+
+    def compare_bacteria(self, names, diff_only=False, transpose=False, format=None):
+        return self.get('/api/compare/bacteria', **_compare_params(names, diff_only, transpose, format))
+
+    def compare_drugs(self, names, diff_only=False, transpose=False, format=None):
+        return self.get('/api/compare/drug', **_compare_params(names, diff_only, transpose, format))
+
+    def similar_drugs(self, name, k=None):
+        return self.get('/api/similar/drug', name=name, k=k)
+
+    def similar_bacteria(self, name, k=None):
+        return self.get('/api/similar/bacteria', name=name, k=k)
+
+    def rollup(self, drug_class=None, bacteria_group=None):
+        return self.get('/api/rollup', drug_class=drug_class, bacteria_group=bacteria_group)
+
+    def statistics(self):
+        return self.get('/api/statistics')
+
+    def changes(self, from_edition=None, to_edition=None, **filters):
+        return self.get('/api/changes', **{'from': from_edition, 'to': to_edition}, **filters)
+
+    def search_bacteria_many(self, names):
+        """批量按细菌搜索，找不到的细菌对应None"""
+        return self._many('/api/search/bacteria', names)
+
+    def search_drug_many(self, names):
+        """批量按药物搜索，找不到的药物对应None"""
+        return self._many('/api/search/drug', names)
+
+    def _many(self, path, names):
+        results = self.batch([(path, {'name': name}) for name in names])
+        for index, result in enumerate(results):
+            if isinstance(result, ApiError):
+                if result.status != 404:
+                    raise result
+                results[index] = None
+        return results
+
+
+class AsyncAntibioticClient:
+    """asyncio客户端：单个查询自动合并为批量请求
+
+    同一事件循环中batch_window秒内发起的search_bacteria / search_drug / get查询会合并为一个（或按max_batch
+    分成几个）/api/batch请求，在线程中由同步客户端执行，适合一次性发起成百上千个查询的调用方。
+    """
+
+    def __init__(self, base_url='http://127.0.0.1:5000', batch_window=0.005, **client_options):
+        self.client = AntibioticClient(base_url, **client_options)
+        self.batch_window = batch_window
+        self._pending = []
+        self._flush_handle = None
+        # 正在发送的批量请求任务；事件循环只保留任务的弱引用，这里持有强引用以免任务被回收
+        self._tasks = set()
+
+    async def close(self):
+        """发出尚在等待窗口中的查询，等全部批量请求完成后再关闭连接"""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.to_thread(self.client.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def get(self, path, **params):
+        """排队等待与同一时间窗口内的其他查询一起发送"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(((path, params), future))
+        if len(self._pending) >= self.client.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        result = await future
+        if isinstance(result, ApiError):
+            raise result
+        return result
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.get_running_loop().create_task(self._send(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, pending):
+        try:
+            results = await asyncio.to_thread(self.client.batch, [call for call, _ in pending])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def search_bacteria(self, name):
+        return await self.get('/api/search/bacteria', name=name)
+
+    async def search_drug(self, name):
+        return await self.get('/api/search/drug', name=name)
+
+    async def compare_bacteria(self, names, diff_only=False, transpose=False, format=None):
+        return await self.get('/api/compare/bacteria', **_compare_params(names, diff_only, transpose, format))
+
+    async def compare_drugs(self, names, diff_only=False, transpose=False, format=None):
+        return await self.get('/api/compare/drug', **_compare_params(names, diff_only, transpose, format))
+
+    async def similar_drugs(self, name, k=None):
+        return await self.get('/api/similar/drug', **_without_none(name=name, k=k))
+
+    async def similar_bacteria(self, name, k=None):
+        return await self.get('/api/similar/bacteria', **_without_none(name=name, k=k))
+
+    async def bacteria(self):
+        return (await self.get('/api/bacteria'))['bacteria']
+
+    async def drugs(self):
+        return (await self.get('/api/drugs'))['drugs']
+
+    async def health(self):
+        return await asyncio.to_thread(self.client.health)
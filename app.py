@@ -1,14 +1,52 @@
-from flask import Flask, render_template, request, jsonify
+import time
+# 启动计时起点，用于输出分阶段的启动耗时
+_startup_began = time.perf_counter()
+
+from flask import Flask, request, jsonify, send_file, send_from_directory, Response, redirect
 import json
 import os
 import sys
 from flask_cors import CORS
 import logging
-from dotenv import load_dotenv
+import logging.handlers
+import hashlib
+import hmac
+import math
+import threading
+import mimetypes
+import re
+from functools import wraps
 from datetime import datetime
+from storage import JsonStore, SqliteStore, normalize_search_term
+from query_cache import QueryCache
+from shared_cache import SharedDiskCache, top_queries
+from profiling import RequestProfiler, ProfilingMiddleware
+from memory_report import deep_sizeof, process_rss, AllocationTracker
+from shadow import ShadowVerifier, StoreDataset
+from admission import (AdmissionController, TokenBucketLimiter, AdmissionMiddleware,
+                       PRIORITY_CHEAP, PRIORITY_EXPENSIVE)
+from events import EventBroadcaster, EventStreamServer
+from overlays import OverlayStore, load_overlays
+
+# 启动各阶段耗时（毫秒）
+startup_report = {}
+_startup_mark = _startup_began
+
+def _startup_phase(name):
+    """记录从上一个阶段结束到现在的耗时"""
+    global _startup_mark
+    now = time.perf_counter()
+    startup_report[name] = round((now - _startup_mark) * 1000, 1)
+    _startup_mark = now
+
+_startup_phase('imports')
 
-# 加载环境变量
-load_dotenv()
+# 加载环境变量：只有存在.env文件时才导入python-dotenv
+_app_root = os.path.dirname(os.path.abspath(__file__))
+if os.path.exists(os.path.join(_app_root, '.env')) or os.path.exists('.env'):
+    from dotenv import load_dotenv
+    load_dotenv()
+_startup_phase('dotenv')
 
 # 创建Flask应用实例
 app = Flask(__name__)
@@ -44,49 +82,713 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# 全局变量存储数据
-antibiotic_data = None
+# 管理员令牌，未配置时所有管理接口均不可用
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
 
-# 加载JSON数据
-def load_data():
-    global antibiotic_data
-    # 支持从环境变量指定数据文件路径
-    json_path = os.environ.get('ANTIBIOTIC_DATA_PATH', 'antibiotic_data.json')
+def is_admin_token(token):
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token or '', ADMIN_TOKEN)
+
+# 管理接口装饰器，要求请求头X-Admin-Token与ADMIN_TOKEN一致
+def admin_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin_token(request.headers.get('X-Admin-Token', '')):
+            logger.warning(f"拒绝未授权的管理请求: {request.path}")
+            return jsonify({'success': False, 'error': '需要管理员权限'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+# 按需性能剖析：默认关闭（抽样比例为0），可通过环境变量或管理接口开启；
+# 携带X-Profile: 1及有效管理员令牌的请求会被强制剖析
+request_profiler = RequestProfiler(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.environ.get('PROFILE_DIR', 'profiles')),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    ring_size=int(os.environ.get('PROFILE_RING_SIZE', 50)),
+    interval=float(os.environ.get('PROFILE_INTERVAL_MS', 1)) / 1000
+)
+app.wsgi_app = ProfilingMiddleware(
+    app.wsgi_app, request_profiler,
+    lambda environ: is_admin_token(environ.get('HTTP_X_ADMIN_TOKEN', ''))
+)
+
+# 准入控制：同时处理的请求数上限、排队上限和排队超时，超出时快速返回503；
+# 按客户端IP的令牌桶限流默认关闭（医院内网常经NAT共用出口IP），需要时通过RATE_LIMIT_PER_SEC开启
+admission_controller = AdmissionController(
+    max_concurrent=int(os.environ.get('ADMISSION_MAX_CONCURRENT', 32)),
+    max_queue=int(os.environ.get('ADMISSION_QUEUE_DEPTH', 64)),
+    queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_MS', 5000)) / 1000,
+    reserved=int(os.environ.get('ADMISSION_RESERVED', 4))
+)
+rate_limiter = TokenBucketLimiter(
+    rate=float(os.environ.get('RATE_LIMIT_PER_SEC', 0)),
+    burst=float(os.environ.get('RATE_LIMIT_BURST', 20))
+)
+
+# 廉价请求：健康检查、列表、详情和管理接口，过载时优先处理且不计入客户端限流
+CHEAP_PATHS = {'/', '/api/health', '/api/bacteria', '/api/drugs', '/api/statistics', '/api/stats'}
+CHEAP_PREFIXES = ('/api/drug/', '/api/bacteria/', '/api/admin/', '/api/debug/', '/static/', '/assets/')
+
+def request_priority(path):
+    # SSE长连接大部分时间处于空闲等待，不占用处理槽位
+    if path == '/api/events':
+        return None
+    if path in CHEAP_PATHS or path.startswith(CHEAP_PREFIXES):
+        return PRIORITY_CHEAP
+    return PRIORITY_EXPENSIVE
+
+app.wsgi_app = AdmissionMiddleware(app.wsgi_app, admission_controller, rate_limiter, request_priority, logger)
+
+# tracemalloc分配跟踪，通过内存诊断接口按需开启
+allocation_tracker = AllocationTracker()
+
+# 全局变量存储数据（JsonStore或SqliteStore）
+data_store = None
+
+# 数据版本标识，数据文件变化后随之改变，用作查询缓存键的一部分
+data_version = None
+
+# 查询结果缓存，相同查询的并发请求合并为一次计算；
+# 配置SHARED_CACHE_DIR后，同一主机上的多个工作进程通过磁盘共享第二级缓存
+SHARED_CACHE_DIR = os.environ.get('SHARED_CACHE_DIR', '')
+query_cache = QueryCache(
+    int(os.environ.get('QUERY_CACHE_SIZE', 1024)),
+    shared=SharedDiskCache(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), SHARED_CACHE_DIR),
+        max_entries=int(os.environ.get('SHARED_CACHE_MAX_ENTRIES', 10000))
+    ) if SHARED_CACHE_DIR else None
+)
+
+# 使用查询缓存的路由，这些路由的成功请求记入访问日志，供启动时预热缓存
+CACHED_QUERY_PATHS = {'/api/search/bacteria', '/api/compare/bacteria', '/api/compare/drug'}
+
+# 访问日志：每行为 时间戳\t状态码\t路径?查询字符串。
+# 多个工作进程以追加方式写同一个文件，单行写入不会交错；RotatingFileHandler在各进程内各自轮转，
+# 会互相截断或丢失日志，因此由外部的logrotate等工具按 access.log -> access.log.1 轮转，
+# WatchedFileHandler发现文件被移走后自动重新打开
+ACCESS_LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               os.environ.get('ACCESS_LOG_PATH', 'access.log'))
+access_logger = logging.getLogger('access')
+access_logger.propagate = False
+access_logger.setLevel(logging.INFO)
+if not access_logger.handlers:
+    _access_handler = logging.handlers.WatchedFileHandler(ACCESS_LOG_PATH, encoding='utf-8')
+    _access_handler.setFormatter(logging.Formatter('%(message)s'))
+    access_logger.addHandler(_access_handler)
+
+# 启动及数据重新加载后，重放访问日志中最近CACHE_WARMUP_WINDOW_HOURS小时内最常见的前N个查询，为0时关闭
+CACHE_WARMUP_TOP_N = int(os.environ.get('CACHE_WARMUP_TOP_N', 50))
+CACHE_WARMUP_WINDOW_HOURS = float(os.environ.get('CACHE_WARMUP_WINDOW_HOURS', 168))
+
+# 预热请求携带该请求头，不计入访问日志，避免预热本身抬高查询的统计次数
+WARMUP_HEADER = 'X-Cache-Warmup'
+
+# 只读查询API的成功响应带ETag，客户端可用If-None-Match重新验证，内容未变时返回304
+ETAG_PATHS = {'/api/bacteria', '/api/drugs', '/api/statistics', '/api/stats', '/api/rollup', '/api/changes'}
+ETAG_PREFIXES = ('/api/search/', '/api/compare/', '/api/similar/', '/api/local/', '/api/drug/', '/api/bacteria/')
+
+# 批量查询API单次最多包含的子请求数
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 50))
+
+# 相似度索引（加载数据时预计算）
+similarity_index = None
+
+# 药物类别×细菌分组汇总统计（加载数据时预计算）
+rollup_index = None
+
+# 数据版本变更通知（/api/events），订阅者共享同一个事件序列，默认开启。
+# EVENTS_PORT大于0时，订阅连接由该端口上的事件流服务（一个asyncio事件循环线程）统一保持，/api/events重定向过去，
+# 空闲订阅不占用Web服务器的工作线程；页面经HTTPS或反向代理访问时，用EVENTS_PUBLIC_URL指定浏览器可访问的事件流地址。
+# EVENTS_PORT为0时由Web服务器的工作线程直接输出事件流，每个订阅占用一个线程，只适合少量订阅者。
+# LIVE_UPDATES=false时/api/events返回204，浏览器收到后不再重连
+LIVE_UPDATES = os.environ.get('LIVE_UPDATES', 'true').lower() == 'true'
+EVENTS_PORT = int(os.environ.get('EVENTS_PORT', 5001))
+EVENTS_PUBLIC_URL = os.environ.get('EVENTS_PUBLIC_URL', '')
+event_broadcaster = EventBroadcaster(
+    max_subscribers=int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', 5000)),
+    heartbeat=float(os.environ.get('EVENTS_HEARTBEAT_SEC', 25))
+)
+event_server = None
+
+# 每个订阅连接建立时先发送的当前数据版本
+def events_hello():
+    return 'hello', {
+        'data_version': data_version,
+        'edition': data_store.edition if data_store is not None else None
+    }
+
+def start_event_server():
+    global event_server
+    if LIVE_UPDATES and EVENTS_PORT > 0:
+        event_server = EventStreamServer(event_broadcaster, os.environ.get('EVENTS_HOST', '0.0.0.0'), EVENTS_PORT,
+                                         initial=events_hello, logger=logger)
+        event_server.start()
+
+def events_url():
+    if EVENTS_PUBLIC_URL:
+        return EVENTS_PUBLIC_URL
+    # 保留IPv6地址的方括号，只替换端口
+    host = request.host if request.host.endswith(']') else request.host.rsplit(':', 1)[0]
+    return f"{request.scheme}://{host}:{EVENTS_PORT}/api/events"
+
+# 通过管理接口切换的数据版本名称（热病版次），为None时使用ANTIBIOTIC_EDITION
+selected_edition = None
+
+# 本地微生物室药敏累计计数（由ingest_isolates.py生成，可选）
+local_susceptibility = None
+
+# 院区覆盖层 {院区: SiteOverlay}（OVERLAY_DIR中每个院区一个文件，可选），
+# 查询参数site指定院区时叠加在基础数据之上
+OVERLAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.environ.get('OVERLAY_DIR', 'overlays'))
+site_overlays = {}
+
+# 敏感性等级的序数值，用于计算抗菌谱距离；"未知"等不在表中的值视为缺失
+SENSITIVITY_LEVELS = {
+    '推荐': 3,
+    '有活性': 2,
+    '不确定': 1,
+    '不推荐': 0
+}
+
+def _compute_data_version(data_full_path, edition):
+    """根据版本名称、文件大小和修改时间生成数据版本标识"""
+    stat = os.stat(data_full_path)
+    raw = f"{edition}|{data_full_path}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:12]
+
+# 存储后端：json（默认，整个数据集在内存中）或sqlite（由storage.py导入的数据库）
+def _storage_backend():
+    return os.environ.get('ANTIBIOTIC_STORAGE', 'json').lower()
+
+# 数据文件的完整路径，支持从环境变量指定
+def _data_file_path(backend):
+    if backend == 'sqlite':
+        data_path = os.environ.get('ANTIBIOTIC_DB_PATH', 'antibiotic_data.db')
+    else:
+        data_path = os.environ.get('ANTIBIOTIC_DATA_PATH', 'antibiotic_data.json')
     
     # 获取应用根目录，确保路径正确
     app_root = os.path.dirname(os.path.abspath(__file__))
-    json_full_path = os.path.join(app_root, json_path)
+    return os.path.join(app_root, data_path)
+
+# 加载数据
+def load_data():
+    global data_store, data_version
+    backend = _storage_backend()
+    edition = selected_edition or os.environ.get('ANTIBIOTIC_EDITION', '')
+    data_full_path = _data_file_path(backend)
+    previous_version = data_version
+    previous_store = data_store
+    previous_edition = data_store.edition if data_store is not None else None
     
-    logger.info(f"尝试加载数据文件: {json_full_path}")
-    if os.path.exists(json_full_path):
+    logger.info(f"尝试加载数据文件: {data_full_path} (存储模式: {backend})")
+    if not os.path.exists(data_full_path):
+        logger.error(f"警告：数据文件不存在: {data_full_path}")
+        _log_kept_store(previous_store)
+        return False
+    
+    # 先完整构建新的存储，成功后再替换；失败（如文件尚未复制完）时继续使用原有存储，
+    # 数据文件监视线程会在下一次检查时重试
+    store = None
+    try:
+        if backend == 'sqlite':
+            store = SqliteStore(data_full_path, edition or None)
+        else:
+            store = JsonStore.from_file(data_full_path, edition or 'default')
+        version = _compute_data_version(data_full_path, store.edition)
+        record_count = store.record_count()
+    except Exception as e:
+        logger.error(f"加载数据文件时出错: {str(e)}")
+        if store is not None:
+            store.close()
+        _log_kept_store(previous_store)
+        return False
+    
+    data_store, data_version = store, version
+    _retire_store(previous_store)
+    query_cache.clear()
+    logger.info(f"数据加载成功，版本 '{data_store.edition}'，包含 {record_count} 条记录，数据版本 {data_version}")
+    load_local_susceptibility()
+    load_site_overlays()
+    schedule_index_warmup()
+    schedule_cache_warmup()
+    publish_data_events(previous_version, previous_edition)
+    return True
+
+def _log_kept_store(store):
+    if store is not None:
+        logger.warning(f"继续使用原有数据，版本 '{store.edition}'，数据版本 {data_version}")
+
+# 关闭被替换的旧存储：旧存储可能仍被进行中的请求使用，close只立即关闭空闲连接，
+# 使用中的连接在这些请求的查询结束、放回连接池时关闭
+def _retire_store(store):
+    if store is not None and store is not data_store:
         try:
-            with open(json_full_path, 'r', encoding='utf-8') as f:
-                antibiotic_data = json.load(f)
-            logger.info(f"数据加载成功，包含 {len(antibiotic_data.get('data', []))} 条记录")
-            return True
+            store.close()
         except Exception as e:
-            logger.error(f"加载数据文件时出错: {str(e)}")
-            antibiotic_data = None
-            return False
-    else:
-        logger.error(f"警告：JSON数据文件不存在: {json_full_path}")
-        antibiotic_data = None
+            logger.error(f"关闭旧数据存储时出错: {str(e)}")
+
+# 重放访问日志中的热门查询，填充进程内缓存（及共享缓存）
+def warm_query_cache():
+    try:
+        started = time.perf_counter()
+        urls = top_queries([ACCESS_LOG_PATH, ACCESS_LOG_PATH + '.1'], CACHED_QUERY_PATHS,
+                           CACHE_WARMUP_TOP_N, max_age=CACHE_WARMUP_WINDOW_HOURS * 3600)
+        failed = 0
+        with app.test_client() as client:
+            for url in urls:
+                if client.get(url, headers={WARMUP_HEADER: '1'}).status_code != 200:
+                    failed += 1
+        elapsed = round((time.perf_counter() - started) * 1000, 1)
+        startup_report.setdefault('cache_warmup', elapsed)
+        logger.info(f"查询缓存预热完成: 重放 {len(urls)} 个查询（失败 {failed} 个），耗时 {elapsed} ms")
+    except Exception as e:
+        logger.error(f"查询缓存预热出错: {str(e)}", exc_info=True)
+
+def schedule_cache_warmup():
+    if CACHE_WARMUP_TOP_N > 0:
+        threading.Thread(target=warm_query_cache, name='cache-warmup', daemon=True).start()
+
+# 数据版本或热病版次变化后通知订阅者，客户端据此清空本地缓存的列表和查询结果
+def publish_data_events(previous_version, previous_edition):
+    if data_version == previous_version:
+        return
+    payload = {
+        'data_version': data_version,
+        'previous_version': previous_version,
+        'edition': data_store.edition,
+        'timestamp': datetime.now().isoformat()
+    }
+    event_broadcaster.publish('data_version', payload)
+    if previous_edition is not None and previous_edition != data_store.edition:
+        event_broadcaster.publish('edition', dict(payload, previous_edition=previous_edition))
+        logger.info(f"数据版本切换: '{previous_edition}' -> '{data_store.edition}'")
+
+# 数据文件变化检测：DATA_WATCH_INTERVAL秒检查一次文件大小和修改时间以及重新加载信号，变化后重新加载；为0时关闭。
+# 多进程部署（如gunicorn多个worker）时必须开启，否则/api/admin/reload只对处理该请求的进程生效
+DATA_WATCH_INTERVAL = float(os.environ.get('DATA_WATCH_INTERVAL', 0))
+
+# 重新加载信号文件：/api/admin/reload写入新的信号（包含选择的热病版次），各进程检测到后切换到同一版次并重新加载；
+# 进程启动时也从中读取当前选择的版次，重启的worker不会退回默认版次
+RELOAD_SIGNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  os.environ.get('RELOAD_SIGNAL_PATH', 'reload_signal.json'))
+_reload_signal_seen = None
+
+def read_reload_signal():
+    try:
+        with open(RELOAD_SIGNAL_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"读取重新加载信号出错: {str(e)}")
+        return None
+
+def write_reload_signal(edition):
+    """原子写入新的重新加载信号并记为本进程已处理"""
+    global _reload_signal_seen
+    signal = {
+        'id': f"{os.getpid()}-{time.time_ns()}",
+        'edition': edition,
+        'requested_at': datetime.now().isoformat()
+    }
+    tmp_path = f"{RELOAD_SIGNAL_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(signal, f, ensure_ascii=False)
+    os.replace(tmp_path, RELOAD_SIGNAL_PATH)
+    _reload_signal_seen = signal['id']
+    return signal
+
+def apply_reload_signal(signal):
+    """采用信号中的版次选择，返回该信号是否为本进程尚未处理的新信号"""
+    global selected_edition, _reload_signal_seen
+    if signal is None or signal.get('id') == _reload_signal_seen:
         return False
+    _reload_signal_seen = signal.get('id')
+    selected_edition = signal.get('edition') or None
+    return True
+
+def _watch_data_file():
+    while True:
+        time.sleep(DATA_WATCH_INTERVAL)
+        try:
+            if apply_reload_signal(read_reload_signal()):
+                logger.info(f"收到其他进程的重新加载信号，版次: {selected_edition or '默认'}")
+                load_data()
+                continue
+            store = data_store
+            data_full_path = _data_file_path(_storage_backend())
+            if not os.path.exists(data_full_path):
+                continue
+            # 上次加载失败（如文件尚未写完）时每次检查都重试
+            if store is None or _compute_data_version(data_full_path, store.edition) != data_version:
+                logger.info(f"检测到数据文件变化，重新加载: {data_full_path}")
+                load_data()
+        except Exception as e:
+            logger.error(f"检查数据文件变化时出错: {str(e)}", exc_info=True)
+
+def start_data_watcher():
+    if DATA_WATCH_INTERVAL > 0:
+        threading.Thread(target=_watch_data_file, name='data-watcher', daemon=True).start()
+
+# 影子验证使用的原始JSON结构数据集，取自处理被抽样请求的存储；
+# SQLite模式下按需从数据库读取，不在内存中物化整个数据集
+def legacy_dataset(store):
+    if store.backend == 'json':
+        return store.data
+    return StoreDataset(store)
+
+# 影子验证：按SHADOW_SAMPLE_RATE抽样线上查询，在后台用原始线性扫描实现复核结果，默认关闭
+shadow_verifier = ShadowVerifier(legacy_dataset, logger, sample_rate=float(os.environ.get('SHADOW_SAMPLE_RATE', 0)))
+
+# 包装查询缓存的计算函数，实际执行时把耗时（毫秒）追加到timing；
+# 结果来自缓存（或与并发的相同查询共享）时timing为空，影子验证不拿缓存命中的耗时与原实现比较
+def timed_compute(fn, timing):
+    def compute():
+        started = time.perf_counter()
+        result = fn()
+        timing.append((time.perf_counter() - started) * 1000)
+        return result
+    return compute
+
+def compute_ms(timing):
+    return timing[0] if timing else None
+
+# 派生索引（相似度索引、汇总统计）的预热方式：
+# background（默认，加载数据后在后台线程构建）、eager（加载数据时同步构建）、lazy（首次使用时构建）
+INDEX_WARMUP = os.environ.get('INDEX_WARMUP', 'background').lower()
+
+# 索引构建锁，保证同一份数据的索引只构建一次
+_index_lock = threading.Lock()
+
+def ensure_indexes():
+    """确保派生索引已构建，尚未构建时在当前线程同步构建"""
+    if similarity_index is not None and rollup_index is not None:
+        return
+    with _index_lock:
+        # 等待锁期间索引可能已由其他线程构建完成
+        if data_store is None or (similarity_index is not None and rollup_index is not None):
+            return
+        started = time.perf_counter()
+        if similarity_index is None:
+            build_similarity_index()
+        if rollup_index is None:
+            build_rollup_index()
+        elapsed = round((time.perf_counter() - started) * 1000, 1)
+        startup_report.setdefault('index_warmup', elapsed)
+        logger.info(f"派生索引构建完成，耗时 {elapsed} ms")
+
+def schedule_index_warmup():
+    """数据(重新)加载后清空派生索引，并按INDEX_WARMUP安排重建"""
+    global similarity_index, rollup_index
+    with _index_lock:
+        similarity_index = None
+        rollup_index = None
+    if INDEX_WARMUP == 'eager':
+        ensure_indexes()
+    elif INDEX_WARMUP == 'background':
+        threading.Thread(target=ensure_indexes, name='index-warmup', daemon=True).start()
+
+def _distance(vector_a, vector_b):
+    """两个等级向量的序数距离：两者均有明确等级的位置上等级差绝对值的平均值，归一化到0~1；
+    没有共同位置时返回None，否则返回 (距离, 共同位置数)"""
+    diffs = [abs(a - b) for a, b in zip(vector_a, vector_b) if a is not None and b is not None]
+    if not diffs:
+        return None
+    return round(sum(diffs) / (len(diffs) * max(SENSITIVITY_LEVELS.values())), 4), len(diffs)
+
+def _pairwise_distances(vectors):
+    """计算一组等级向量两两之间的序数距离，返回按距离升序排列的近邻表"""
+    names = list(vectors.keys())
+    neighbours = {name: [] for name in names}
+    
+    for i, name_a in enumerate(names):
+        vector_a = vectors[name_a]
+        for name_b in names[i + 1:]:
+            measured = _distance(vector_a, vectors[name_b])
+            if measured is None:
+                continue
+            distance, shared = measured
+            neighbours[name_a].append({'name': name_b, 'distance': distance, 'shared': shared})
+            neighbours[name_b].append({'name': name_a, 'distance': distance, 'shared': shared})
+    
+    # 距离相同时保持原始Excel中的顺序
+    order = {name: idx for idx, name in enumerate(names)}
+    for items in neighbours.values():
+        items.sort(key=lambda item: (item['distance'], order[item['name']]))
+    return neighbours
+
+def _sensitivity_vectors(store):
+    """将敏感性矩阵转换为序数等级（缺失值为None），返回 (细菌等级向量, 药物等级向量)"""
+    records = list(store.iter_records())
+    drug_list = store.drug_names()
+    matrix = [
+        [SENSITIVITY_LEVELS.get(record.get('antibiotics', {}).get(drug)) for drug in drug_list]
+        for record in records
+    ]
+    bacteria_vectors = {record.get('bacteria', ''): row for record, row in zip(records, matrix)}
+    drug_vectors = {drug: [row[col] for row in matrix] for col, drug in enumerate(drug_list)}
+    return bacteria_vectors, drug_vectors
+
+def _site_neighbours(kind, name, store):
+    """院区视图中某个药物（kind='drug'）或细菌（kind='bacteria'）的近邻：
+    在叠加覆盖后的矩阵上只计算该对象与其余对象的距离，不为每个院区构建完整的相似度索引；
+    结果按院区缓存，对象不存在时返回None"""
+    def compute():
+        bacteria_vectors, drug_vectors = _sensitivity_vectors(store)
+        vectors = drug_vectors if kind == 'drug' else bacteria_vectors
+        if name not in vectors:
+            return None
+        neighbours = []
+        for order, (other, vector) in enumerate(vectors.items()):
+            measured = None if other == name else _distance(vectors[name], vector)
+            if measured is not None:
+                neighbours.append((measured[0], order, {'name': other, 'distance': measured[0], 'shared': measured[1]}))
+        neighbours.sort(key=lambda item: item[:2])
+        return [item for _, _, item in neighbours]
+    
+    return query_cache.get_or_compute((f'similar_{kind}', site_data_version(), name), compute)
+
+# 构建药物/细菌相似度索引
+def build_similarity_index():
+    """基于敏感性矩阵预计算药物之间、细菌之间的两两距离，每次加载数据时重建"""
+    global similarity_index
+    try:
+        bacteria_vectors, drug_vectors = _sensitivity_vectors(data_store)
+        similarity_index = {
+            'bacteria': _pairwise_distances(bacteria_vectors),
+            'drug': _pairwise_distances(drug_vectors)
+        }
+        logger.info(f"相似度索引构建完成: {len(bacteria_vectors)} 种细菌, {len(drug_vectors)} 种药物")
+    except Exception as e:
+        logger.error(f"构建相似度索引时出错: {str(e)}", exc_info=True)
+        similarity_index = None
+
+# 未在分类中出现的药物或细菌归入该类别（与convert_to_json.py一致）
+UNCLASSIFIED = '未分类'
+
+def _invert_groups(groups, names):
+    """将{分组: [成员]}反转为{成员: 分组}，数据中未归类的成员归入未分类"""
+    group_of = {}
+    for group_name, members in groups.items():
+        for member in members:
+            group_of[member] = group_name
+    for name in names:
+        group_of.setdefault(name, UNCLASSIFIED)
+    return group_of
+
+def _ordered_groups(groups, group_of):
+    """分组名称列表，保持分类文件中的顺序，"未分类"放在最后"""
+    ordered = [group_name for group_name in groups if group_name in group_of.values()]
+    if UNCLASSIFIED in group_of.values() and UNCLASSIFIED not in ordered:
+        ordered.append(UNCLASSIFIED)
+    return ordered
 
-# 主页路由
+# 构建药物类别×细菌分组的汇总统计
+def build_rollup_index():
+    """按(药物类别, 细菌分组)、(药物, 细菌分组)、(药物类别, 细菌)三个层级预计算各敏感性等级的数量"""
+    global rollup_index
+    try:
+        drug_list = data_store.drug_names()
+        bacteria_list = data_store.bacteria_names()
+        
+        drug_classes = data_store.drug_classes()
+        bacteria_groups = data_store.bacteria_groups()
+        class_of = _invert_groups(drug_classes, drug_list)
+        group_of = _invert_groups(bacteria_groups, bacteria_list)
+        
+        class_group = {}
+        drug_group = {}
+        class_bacteria = {}
+        
+        for record in data_store.iter_records():
+            bacteria = record.get('bacteria', '')
+            group = group_of[bacteria]
+            antibiotics = record.get('antibiotics', {})
+            for drug in drug_list:
+                sensitivity = antibiotics.get(drug, '未知')
+                drug_class = class_of[drug]
+                for counts in (
+                    class_group.setdefault(drug_class, {}).setdefault(group, {}),
+                    drug_group.setdefault(drug, {}).setdefault(group, {}),
+                    class_bacteria.setdefault(drug_class, {}).setdefault(bacteria, {})
+                ):
+                    counts[sensitivity] = counts.get(sensitivity, 0) + 1
+        
+        rollup_index = {
+            'drug_classes': _ordered_groups(drug_classes, class_of),
+            'bacteria_groups': _ordered_groups(bacteria_groups, group_of),
+            'class_of': class_of,
+            'group_of': group_of,
+            'class_group': class_group,
+            'drug_group': drug_group,
+            'class_bacteria': class_bacteria
+        }
+        logger.info(f"汇总统计构建完成: {len(rollup_index['drug_classes'])} 个药物类别, {len(rollup_index['bacteria_groups'])} 个细菌分组")
+    except Exception as e:
+        logger.error(f"构建汇总统计时出错: {str(e)}", exc_info=True)
+        rollup_index = None
+
+# 加载本地药敏累计计数
+def load_local_susceptibility():
+    """读取ingest_isolates.py生成的计数文件，并将本地细菌名称映射到指南中的细菌"""
+    global local_susceptibility
+    stats_path = os.environ.get('ISOLATE_STATS_PATH', 'isolate_stats.json')
+    app_root = os.path.dirname(os.path.abspath(__file__))
+    stats_full_path = os.path.join(app_root, stats_path)
+    
+    if not os.path.exists(stats_full_path):
+        logger.info(f"未找到本地药敏计数文件，跳过加载: {stats_full_path}")
+        local_susceptibility = None
+        return False
+    
+    try:
+        with open(stats_full_path, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        
+        # 本地细菌名称使用与细菌搜索相同的匹配规则映射到指南中的细菌，只需在加载时计算一次
+        bacteria_map = {}
+        by_bacteria = {}
+        unmatched = set()
+        for organism, drug, ward, month, s, i, r in stored.get('counters', []):
+            if organism not in bacteria_map:
+                record = data_store.find_bacteria(organism)
+                bacteria_map[organism] = record.get('bacteria') if record else None
+            bacteria = bacteria_map[organism]
+            if bacteria is None:
+                unmatched.add(organism)
+                continue
+            by_bacteria.setdefault(bacteria, {}).setdefault(drug, []).append((ward, month, s, i, r))
+        
+        local_susceptibility = {
+            'updated_at': stored.get('updated_at'),
+            'by_bacteria': by_bacteria,
+            'unmatched_organisms': sorted(unmatched)
+        }
+        logger.info(f"本地药敏计数加载成功: {len(by_bacteria)} 种细菌, {len(unmatched)} 个未匹配的细菌名称")
+        return True
+    except Exception as e:
+        logger.error(f"加载本地药敏计数时出错: {str(e)}", exc_info=True)
+        local_susceptibility = None
+        return False
+
+# 加载院区覆盖层
+def load_site_overlays():
+    """读取OVERLAY_DIR中各院区的覆盖文件；覆盖表中的细菌名称按当前数据解析，因此每次加载数据后重新读取"""
+    global site_overlays
+    try:
+        site_overlays = load_overlays(OVERLAY_DIR, data_store, logger)
+        if site_overlays:
+            summary = ", ".join(f"{site}({overlay.override_count()} 条)" for site, overlay in site_overlays.items())
+            logger.info(f"院区覆盖层加载成功: {summary}")
+        return True
+    except Exception as e:
+        logger.error(f"加载院区覆盖层时出错: {str(e)}", exc_info=True)
+        site_overlays = {}
+        return False
+
+# 当前请求的院区（查询参数site），未指定时为空字符串
+def current_site():
+    return request.args.get('site', '').strip()
+
+def site_store():
+    """当前请求使用的数据存储：指定院区时为叠加该院区覆盖层的视图，否则为基础数据"""
+    overlay = site_overlays.get(current_site())
+    if overlay is None or data_store is None:
+        return data_store
+    return OverlayStore(data_store, overlay)
+
+def site_data_version():
+    """当前请求的数据版本：指定院区时附加院区名称和覆盖表版本。
+    同时作为查询缓存键的命名空间，各院区的缓存条目互不混用，覆盖表修改后旧条目自然失效"""
+    overlay = site_overlays.get(current_site())
+    if overlay is None or not data_version:
+        return data_version
+    return f"{data_version}.{overlay.site}.{overlay.version}"
+
+def _local_summary(entries, ward, month_from, month_to):
+    """按病区和月份范围汇总S/I/R计数，并计算敏感率"""
+    s_total = i_total = r_total = 0
+    for entry_ward, month, s, i, r in entries:
+        if ward and entry_ward != ward:
+            continue
+        if month_from and month < month_from:
+            continue
+        if month_to and month > month_to:
+            continue
+        s_total += s
+        i_total += i
+        r_total += r
+    tested = s_total + i_total + r_total
+    return {
+        'S': s_total,
+        'I': i_total,
+        'R': r_total,
+        'tested': tested,
+        'percent_susceptible': round(s_total * 100.0 / tested, 1) if tested else None
+    }
+
+def _local_filters():
+    """读取本地药敏查询的过滤参数：ward、from/to（YYYY-MM）"""
+    return (
+        request.args.get('ward', '').strip(),
+        request.args.get('from', '').strip(),
+        request.args.get('to', '').strip()
+    )
+
+# 解析top-k参数
+def _parse_top_k(default=10, maximum=100):
+    try:
+        top_k = int(request.args.get('k', default))
+    except ValueError:
+        return None
+    if top_k < 1:
+        return None
+    return min(top_k, maximum)
+
+# build_assets.py生成的页面和带指纹的静态资源
+TEMPLATE_INDEX = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'index.html')
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+
+# 文件名中带内容指纹的资源内容永远不变，可以长期缓存
+_FINGERPRINTED = re.compile(r'\.[0-9a-f]{10}\.[A-Za-z0-9]+$')
+
+# 主页路由：优先使用build_assets.py生成的页面，未构建时直接返回源页面（依赖CDN资源）；
+# 页面本身每次都向服务端验证（ETag），内容未变时只返回304
 @app.route('/')
 def index():
-    return render_template('index.html')
+    if os.path.exists(TEMPLATE_INDEX):
+        return send_file(TEMPLATE_INDEX, mimetype='text/html', max_age=0)
+    return send_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'index.html'),
+                     mimetype='text/html', max_age=0)
+
+# 静态资源路由：客户端支持时返回预压缩的.br/.gz版本，带指纹的文件设置一年的immutable缓存
+@app.route('/assets/<path:filename>')
+def static_assets(filename):
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = None
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        # 按Accept-Encoding解析后的质量值判断，q=0表示客户端明确不接受该编码
+        if request.accept_encodings.quality(encoding) > 0 and os.path.isfile(os.path.join(ASSETS_DIR, filename + suffix)):
+            response = send_from_directory(ASSETS_DIR, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(ASSETS_DIR, filename, mimetype=mimetype)
+    
+    response.headers['Vary'] = 'Accept-Encoding'
+    if _FINGERPRINTED.search(filename):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 # 新的细菌列表API端点（支持分页）
 @app.route('/api/bacteria', methods=['GET'])
 def get_bacteria():
     try:
-        if antibiotic_data is None:
+        if data_store is None:
             logger.error("细菌列表API: 数据未加载")
             return jsonify({'success': False, 'error': '数据未加载'}), 500
         
-        bacteria_list = [record.get('bacteria', '') for record in antibiotic_data.get('data', [])]
+        bacteria_list = data_store.bacteria_names()
         
         logger.info(f"细菌列表API: 返回 {len(bacteria_list)} 种细菌")
         return jsonify({
@@ -109,18 +811,12 @@ def get_drug_detail(drug_id):
     try:
         logger.info(f"获取药物详情API: ID={drug_id}")
         
-        if antibiotic_data is None:
+        if data_store is None:
             logger.error("药物详情API: 数据未加载")
             return jsonify({'success': False, 'error': '数据未加载'}), 500
         
         # 获取所有药物列表并排序
-        drug_set = set()
-        for record in antibiotic_data.get('data', []):
-            for drug in record.get('antibiotics', {}).keys():
-                drug_set.add(drug)
-        
-        drug_list = list(drug_set)
-        drug_list.sort()
+        drug_list = sorted(data_store.drug_names())
         
         # 检查ID是否有效
         if drug_id < 1 or drug_id > len(drug_list):
@@ -131,13 +827,7 @@ def get_drug_detail(drug_id):
         drug_name = drug_list[drug_id - 1]  # ID从1开始
         
         # 查找该药物的所有细菌敏感性数据
-        bacteria_results = []
-        for record in antibiotic_data.get('data', []):
-            if drug_name in record.get('antibiotics', {}):
-                bacteria_results.append({
-                    'bacteria': record.get('bacteria'),
-                    'sensitivity': record['antibiotics'][drug_name]
-                })
+        bacteria_results = site_store().drug_results(drug_name) or []
         
         logger.info(f"药物详情API: 找到药物 '{drug_name}' 的 {len(bacteria_results)} 条数据")
         return jsonify({
@@ -161,20 +851,18 @@ def get_bacteria_detail(bacteria_id):
     try:
         logger.info(f"获取细菌详情API: ID={bacteria_id}")
         
-        if antibiotic_data is None:
+        if data_store is None:
             logger.error("细菌详情API: 数据未加载")
             return jsonify({'success': False, 'error': '数据未加载'}), 500
         
-        data_records = antibiotic_data.get('data', [])
+        # 获取对应ID的细菌记录
+        record = site_store().get_record(bacteria_id - 1)  # ID从1开始
         
         # 检查ID是否有效
-        if bacteria_id < 1 or bacteria_id > len(data_records):
+        if record is None:
             logger.warning(f"细菌详情API: 无效的细菌ID={bacteria_id}")
             return jsonify({'success': False, 'error': '细菌不存在'}), 404
         
-        # 获取对应ID的细菌记录
-        record = data_records[bacteria_id - 1]  # ID从1开始
-        
         logger.info(f"细菌详情API: 找到细菌 '{record.get('bacteria')}' 的数据")
         return jsonify({
             'success': True,
@@ -194,18 +882,12 @@ def get_bacteria_detail(bacteria_id):
 @app.route('/api/drugs', methods=['GET'])
 def get_drugs():
     try:
-        if antibiotic_data is None:
+        if data_store is None:
             logger.error("药物列表API: 数据未加载")
             return jsonify({'success': False, 'error': '数据未加载'}), 500
         
         # 统计所有药物种类
-        drug_set = set()
-        for record in antibiotic_data.get('data', []):
-            for drug in record.get('antibiotics', {}).keys():
-                drug_set.add(drug)
-        
-        drug_list = list(drug_set)
-        drug_list.sort()  # 排序以便稳定输出
+        drug_list = sorted(data_store.drug_names())  # 排序以便稳定输出
         
         # 简单实现，返回所有药物
         logger.info(f"药物列表API: 返回 {len(drug_list)} 种药物")
@@ -233,29 +915,28 @@ def search_by_bacteria():
             logger.warning("细菌搜索请求参数为空")
             return jsonify({'success': False, 'error': '请提供细菌名称'}), 400
         
-        if antibiotic_data is None:
+        store = site_store()
+        if store is None:
             logger.error("细菌搜索时数据未加载")
             return jsonify({'success': False, 'error': '数据未加载'}), 500
         
-        # 转换搜索词为小写用于模糊匹配
-        search_term_lower = bacteria_name.lower()
-        
-        # 在数据中查找对应的细菌，支持模糊匹配
-        for record in antibiotic_data.get('data', []):
+        # 在数据中查找对应的细菌，支持模糊匹配：
+        # 记录中的细菌名称包含搜索词，或者搜索词包含记录中的细菌名称（去除拉丁名部分）
+        timing = []
+        cache_key = ('search_bacteria', site_data_version(), normalize_search_term(bacteria_name))
+        record = query_cache.get_or_compute(cache_key, timed_compute(lambda: store.find_bacteria(bacteria_name), timing))
+        # 影子验证的原始实现只有基础数据，院区查询不参与
+        if store is data_store:
+            shadow_verifier.submit('search_bacteria', bacteria_name, record, compute_ms(timing), store)
+        if record is not None:
             record_bacteria = record.get('bacteria', '')
-            # 去除换行符并转换为小写进行比较
-            normalized_bacteria = record_bacteria.replace('\n', ' ').lower()
-            search_term_normalized = search_term_lower.replace('\n', ' ')
-            
-            # 如果记录中的细菌名称包含搜索词，或者搜索词包含记录中的细菌名称（去除拉丁名部分）
-            if search_term_normalized in normalized_bacteria or normalized_bacteria.split(' ')[0] in search_term_normalized:
-                result = {
-                    'success': True,
-                    'bacteria': record_bacteria,
-                    'antibiotics': record.get('antibiotics', {})
-                }
-                logger.info(f"找到细菌: '{record_bacteria}'，包含 {len(result['antibiotics'])} 条药敏数据")
-                return jsonify(result)
+            result = {
+                'success': True,
+                'bacteria': record_bacteria,
+                'antibiotics': record.get('antibiotics', {})
+            }
+            logger.info(f"找到细菌: '{record_bacteria}'，包含 {len(result['antibiotics'])} 条药敏数据")
+            return jsonify(result)
         
         logger.info(f"未找到匹配的细菌: '{bacteria_name}'")
         return jsonify({'success': False, 'error': '未找到该细菌的记录'}), 404
@@ -278,38 +959,24 @@ def search_by_drug():
             logger.warning("药物搜索请求参数为空")
             return jsonify({'success': False, 'error': '请提供药物名称'}), 400
         
-        if antibiotic_data is None:
+        store = site_store()
+        if store is None:
             logger.error("药物搜索时数据未加载")
             return jsonify({'success': False, 'error': '数据未加载'}), 500
         
         # 使用药物索引查找数据，确保按原始Excel从上到下的顺序返回结果
-        if 'drug_indexed' in antibiotic_data and drug_name in antibiotic_data['drug_indexed']:
-            # drug_indexed中的结果已经按照原始Excel中的细菌顺序存储
-            results = antibiotic_data['drug_indexed'][drug_name]
-            logger.info(f"通过索引找到药物: '{drug_name}'，包含 {len(results)} 条细菌敏感性数据")
+        started = time.perf_counter()
+        results = store.drug_results(drug_name)
+        if store is data_store:
+            shadow_verifier.submit('search_drug', drug_name, results, (time.perf_counter() - started) * 1000, store)
+        if results:
+            logger.info(f"找到药物: '{drug_name}'，包含 {len(results)} 条细菌敏感性数据")
             return jsonify({
                 'success': True,
                 'drug': drug_name,
                 'bacteria_results': results
             })
         
-        # 如果药物索引不存在，使用替代方法查找
-        alternative_results = []
-        for record in antibiotic_data.get('data', []):
-            if drug_name in record.get('antibiotics', {}):
-                alternative_results.append({
-                    'bacteria': record.get('bacteria'),
-                    'sensitivity': record['antibiotics'][drug_name]
-                })
-        
-        if alternative_results:
-            logger.info(f"通过替代方法找到药物: '{drug_name}'，包含 {len(alternative_results)} 条细菌敏感性数据")
-            return jsonify({
-                'success': True,
-                'drug': drug_name,
-                'bacteria_results': alternative_results
-            })
-        
         logger.info(f"未找到匹配的药物: '{drug_name}'")
         return jsonify({'success': False, 'error': '未找到该药物的记录'}), 404
     except Exception as e:
@@ -324,21 +991,16 @@ def search_by_drug():
 @app.route('/api/statistics', methods=['GET'])
 def get_statistics():
     try:
-        if antibiotic_data is None:
+        if data_store is None:
             logger.error("统计信息API: 数据未加载")
             return jsonify({'success': False, 'error': '数据未加载'}), 500
         
-        total_bacteria = len(antibiotic_data.get('data', []))
-        bacteria_list = [record.get('bacteria', '') for record in antibiotic_data.get('data', [])]
+        bacteria_list = data_store.bacteria_names()
+        total_bacteria = len(bacteria_list)
         
         # 统计所有药物种类
-        drug_set = set()
-        for record in antibiotic_data.get('data', []):
-            for drug in record.get('antibiotics', {}).keys():
-                drug_set.add(drug)
-        
-        total_drugs = len(drug_set)
-        drug_list = list(drug_set)
+        drug_list = data_store.drug_names()
+        total_drugs = len(drug_list)
         
         logger.info(f"统计信息: {total_bacteria} 种细菌, {total_drugs} 种药物")
         return jsonify({
@@ -359,28 +1021,435 @@ def get_statistics():
 # 兼容旧的统计信息API
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
-    if antibiotic_data:
+    if data_store:
         return jsonify({
             'success': True,
-            'bacteria_count': len(antibiotic_data.get('bacteria_list', [])),
-            'drug_count': len(antibiotic_data.get('drug_list', [])),
-            'record_count': len(antibiotic_data.get('data', []))
+            'bacteria_count': len(data_store.bacteria_names()),
+            'drug_count': len(data_store.drug_names()),
+            'record_count': data_store.record_count()
         })
     else:
         return jsonify({'success': False, 'error': '数据未加载'})
 
-# 比较多个细菌的API
-@app.route('/api/compare/bacteria', methods=['GET'])
-def compare_bacteria():
-    # 获取查询参数中的细菌名称列表
-    bacteria_names = request.args.getlist('name')
-    
-    if not bacteria_names or len(bacteria_names) < 2:
-        return jsonify({'success': False, 'error': '请至少提供两个细菌名称'})
-    
-    if not antibiotic_data:
-        return jsonify({'success': False, 'error': '数据未加载'})
+# 相似药物API：抗菌谱最接近的替代药物
+@app.route('/api/similar/drug', methods=['GET'])
+def similar_drugs():
+    try:
+        drug_name = request.args.get('name', '').strip()
+        logger.info(f"接收到相似药物请求: '{drug_name}'")
+        
+        if not drug_name:
+            return jsonify({'success': False, 'error': '请提供药物名称'}), 400
+        
+        top_k = _parse_top_k()
+        if top_k is None:
+            return jsonify({'success': False, 'error': '参数k必须为正整数'}), 400
+        
+        ensure_indexes()
+        if data_store is None or similarity_index is None:
+            logger.error("相似药物API: 数据未加载")
+            return jsonify({'success': False, 'error': '数据未加载'}), 500
+        
+        store = site_store()
+        if store is data_store:
+            neighbours = similarity_index['drug'].get(drug_name)
+        else:
+            neighbours = _site_neighbours('drug', drug_name, store)
+        if neighbours is None:
+            logger.info(f"相似药物API: 未找到药物 '{drug_name}'")
+            return jsonify({'success': False, 'error': '未找到该药物的记录'}), 404
+        
+        return jsonify({
+            'success': True,
+            'drug': drug_name,
+            'similar': [
+                {'drug': item['name'], 'distance': item['distance'], 'shared': item['shared']}
+                for item in neighbours[:top_k]
+            ]
+        })
+    except Exception as e:
+        logger.error(f"相似药物API出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '查询相似药物时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
+
+# 相似细菌API：耐药谱最接近的细菌
+@app.route('/api/similar/bacteria', methods=['GET'])
+def similar_bacteria():
+    try:
+        bacteria_name = request.args.get('name', '').strip()
+        logger.info(f"接收到相似细菌请求: '{bacteria_name}'")
+        
+        if not bacteria_name:
+            return jsonify({'success': False, 'error': '请提供细菌名称'}), 400
+        
+        top_k = _parse_top_k()
+        if top_k is None:
+            return jsonify({'success': False, 'error': '参数k必须为正整数'}), 400
+        
+        ensure_indexes()
+        if data_store is None or similarity_index is None:
+            logger.error("相似细菌API: 数据未加载")
+            return jsonify({'success': False, 'error': '数据未加载'}), 500
+        
+        store = site_store()
+        record = store.find_bacteria(bacteria_name)
+        if record is None:
+            logger.info(f"相似细菌API: 未找到细菌 '{bacteria_name}'")
+            return jsonify({'success': False, 'error': '未找到该细菌的记录'}), 404
+        
+        if store is data_store:
+            neighbours = similarity_index['bacteria'].get(record.get('bacteria', ''), [])
+        else:
+            neighbours = _site_neighbours('bacteria', record.get('bacteria', ''), store) or []
+        return jsonify({
+            'success': True,
+            'bacteria': record.get('bacteria'),
+            'similar': [
+                {'bacteria': item['name'], 'distance': item['distance'], 'shared': item['shared']}
+                for item in neighbours[:top_k]
+            ]
+        })
+    except Exception as e:
+        logger.error(f"相似细菌API出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '查询相似细菌时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
+
+def _rollup_row(counts, **labels):
+    row = dict(labels)
+    row['counts'] = counts
+    row['total'] = sum(counts.values())
+    return row
+
+def _site_rollup_delta(store):
+    """院区覆盖对汇总统计各计数的增减 {表: {外层键: {内层键: {结论: 增减}}}}，
+    大小只与被改写的格子数成正比，结果按院区缓存"""
+    def compute():
+        class_of = rollup_index['class_of']
+        group_of = rollup_index['group_of']
+        delta = {}
+        for bacteria, drug, previous, sensitivity in store.changed_cells():
+            for table, outer, inner in (
+                ('class_group', class_of[drug], group_of[bacteria]),
+                ('drug_group', drug, group_of[bacteria]),
+                ('class_bacteria', class_of[drug], bacteria)
+            ):
+                change = delta.setdefault(table, {}).setdefault(outer, {}).setdefault(inner, {})
+                change[previous] = change.get(previous, 0) - 1
+                change[sensitivity] = change.get(sensitivity, 0) + 1
+        return delta
     
+    return query_cache.get_or_compute(('rollup_delta', site_data_version()), compute)
+
+def _rollup_counts(table, outer, inner, delta):
+    """汇总统计中的一组计数，叠加院区覆盖造成的增减；没有变化时直接返回预计算的计数"""
+    counts = rollup_index[table][outer][inner]
+    change = delta.get(table, {}).get(outer, {}).get(inner)
+    if not change:
+        return counts
+    counts = dict(counts)
+    for sensitivity, diff in change.items():
+        counts[sensitivity] = counts.get(sensitivity, 0) + diff
+        if not counts[sensitivity]:
+            del counts[sensitivity]
+    return counts
+
+# 药物类别×细菌分组汇总API，支持逐级下钻
+@app.route('/api/rollup', methods=['GET'])
+def get_rollup():
+    """不带参数时返回类别×分组汇总；
+    指定drug_class时下钻到该类别内的各药物；指定bacteria_group时下钻到该分组内的各细菌；
+    两者都指定时返回该区块内每个(药物, 细菌)的原始敏感性"""
+    try:
+        drug_class = request.args.get('drug_class', '').strip()
+        bacteria_group = request.args.get('bacteria_group', '').strip()
+        logger.info(f"汇总统计API: drug_class='{drug_class}', bacteria_group='{bacteria_group}'")
+        
+        ensure_indexes()
+        if data_store is None or rollup_index is None:
+            logger.error("汇总统计API: 数据未加载")
+            return jsonify({'success': False, 'error': '数据未加载'}), 500
+        
+        if drug_class and drug_class not in rollup_index['drug_classes']:
+            return jsonify({'success': False, 'error': '未找到该药物类别'}), 404
+        if bacteria_group and bacteria_group not in rollup_index['bacteria_groups']:
+            return jsonify({'success': False, 'error': '未找到该细菌分组'}), 404
+        
+        store = site_store()
+        delta = _site_rollup_delta(store) if store is not data_store else {}
+        class_of = rollup_index['class_of']
+        group_of = rollup_index['group_of']
+        drugs = [drug for drug in store.drug_names() if class_of.get(drug) == drug_class]
+        bacteria = [name for name in store.bacteria_names() if group_of.get(name) == bacteria_group]
+        
+        if drug_class and bacteria_group:
+            level = 'cell'
+            records = {
+                record.get('bacteria', ''): record.get('antibiotics', {})
+                for record in store.iter_records() if record.get('bacteria', '') in bacteria
+            }
+            rows = [
+                {'drug': drug, 'bacteria': name, 'sensitivity': records[name].get(drug, '未知')}
+                for drug in drugs for name in bacteria
+            ]
+        elif drug_class:
+            level = 'drug'
+            rows = [
+                _rollup_row(_rollup_counts('drug_group', drug, group, delta), drug=drug, bacteria_group=group)
+                for drug in drugs for group in rollup_index['bacteria_groups']
+            ]
+        elif bacteria_group:
+            level = 'bacteria'
+            rows = [
+                _rollup_row(_rollup_counts('class_bacteria', class_name, name, delta), drug_class=class_name, bacteria=name)
+                for class_name in rollup_index['drug_classes'] for name in bacteria
+            ]
+        else:
+            level = 'class'
+            rows = [
+                _rollup_row(_rollup_counts('class_group', class_name, group, delta), drug_class=class_name, bacteria_group=group)
+                for class_name in rollup_index['drug_classes'] for group in rollup_index['bacteria_groups']
+            ]
+        
+        return jsonify({
+            'success': True,
+            'level': level,
+            'drug_class': drug_class or None,
+            'bacteria_group': bacteria_group or None,
+            'drug_classes': rollup_index['drug_classes'],
+            'bacteria_groups': rollup_index['bacteria_groups'],
+            'rollup': rows
+        })
+    except Exception as e:
+        logger.error(f"汇总统计API出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '获取汇总统计时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
+
+# 本地药敏：某细菌对各药物的本地敏感率与指南推荐
+@app.route('/api/local/bacteria', methods=['GET'])
+def local_by_bacteria():
+    try:
+        bacteria_name = request.args.get('name', '').strip()
+        ward, month_from, month_to = _local_filters()
+        logger.info(f"本地药敏细菌查询: '{bacteria_name}', 病区='{ward}', 月份={month_from}~{month_to}")
+        
+        if not bacteria_name:
+            return jsonify({'success': False, 'error': '请提供细菌名称'}), 400
+        
+        if data_store is None:
+            logger.error("本地药敏细菌查询: 数据未加载")
+            return jsonify({'success': False, 'error': '数据未加载'}), 500
+        
+        if local_susceptibility is None:
+            return jsonify({'success': False, 'error': '未导入本地药敏数据'}), 404
+        
+        store = site_store()
+        record = store.find_bacteria(bacteria_name)
+        if record is None:
+            return jsonify({'success': False, 'error': '未找到该细菌的记录'}), 404
+        
+        bacteria = record.get('bacteria')
+        guideline = record.get('antibiotics', {})
+        local_drugs = local_susceptibility['by_bacteria'].get(bacteria, {})
+        
+        # 先按指南药物顺序输出，再附加只在本地数据中出现的药物
+        drugs = store.drug_names() + sorted(set(local_drugs) - set(guideline))
+        results = []
+        for drug in drugs:
+            results.append({
+                'drug': drug,
+                'sensitivity': guideline.get(drug),
+                'local': _local_summary(local_drugs.get(drug, []), ward, month_from, month_to)
+            })
+        
+        return jsonify({
+            'success': True,
+            'bacteria': bacteria,
+            'ward': ward or None,
+            'from': month_from or None,
+            'to': month_to or None,
+            'updated_at': local_susceptibility['updated_at'],
+            'drug_results': results
+        })
+    except Exception as e:
+        logger.error(f"本地药敏细菌查询出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '查询本地药敏数据时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
+
+# 本地药敏：某药物对各细菌的本地敏感率与指南推荐
+@app.route('/api/local/drug', methods=['GET'])
+def local_by_drug():
+    try:
+        drug_name = request.args.get('name', '').strip()
+        ward, month_from, month_to = _local_filters()
+        logger.info(f"本地药敏药物查询: '{drug_name}', 病区='{ward}', 月份={month_from}~{month_to}")
+        
+        if not drug_name:
+            return jsonify({'success': False, 'error': '请提供药物名称'}), 400
+        
+        if data_store is None:
+            logger.error("本地药敏药物查询: 数据未加载")
+            return jsonify({'success': False, 'error': '数据未加载'}), 500
+        
+        if local_susceptibility is None:
+            return jsonify({'success': False, 'error': '未导入本地药敏数据'}), 404
+        
+        by_bacteria = local_susceptibility['by_bacteria']
+        store = site_store()
+        in_guideline = drug_name in store.drug_names()
+        if not in_guideline and not any(drug_name in drugs for drugs in by_bacteria.values()):
+            return jsonify({'success': False, 'error': '未找到该药物的记录'}), 404
+        
+        results = []
+        for record in store.iter_records():
+            bacteria = record.get('bacteria')
+            results.append({
+                'bacteria': bacteria,
+                'sensitivity': record.get('antibiotics', {}).get(drug_name),
+                'local': _local_summary(by_bacteria.get(bacteria, {}).get(drug_name, []), ward, month_from, month_to)
+            })
+        
+        return jsonify({
+            'success': True,
+            'drug': drug_name,
+            'ward': ward or None,
+            'from': month_from or None,
+            'to': month_to or None,
+            'updated_at': local_susceptibility['updated_at'],
+            'bacteria_results': results
+        })
+    except Exception as e:
+        logger.error(f"本地药敏药物查询出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '查询本地药敏数据时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
+
+# 跨版本变化报告目录（由edition_changes.py生成），报告按文件修改时间缓存
+CHANGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.environ.get('CHANGES_DIR', 'changes'))
+_change_reports = {}
+
+def _load_change_report(file_name):
+    path = os.path.join(CHANGES_DIR, file_name)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _change_reports.get(file_name)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        cached = (mtime, report, _change_rows(report))
+        _change_reports[file_name] = cached
+    return cached[1], cached[2]
+
+def _change_direction(old, new):
+    """结论变化方向：upgrade（更推荐）、downgrade（更不推荐），涉及未知等非等级结论时为changed"""
+    if old in SENSITIVITY_LEVELS and new in SENSITIVITY_LEVELS:
+        return 'upgrade' if SENSITIVITY_LEVELS[new] > SENSITIVITY_LEVELS[old] else 'downgrade'
+    return 'changed'
+
+def _change_rows(report):
+    """将紧凑的变化索引展开为逐条记录"""
+    bacteria, drugs, verdicts = report['bacteria'], report['drugs'], report['verdicts']
+    rows = []
+    for bacteria_idx, drug_idx, old_idx, new_idx in report['changes']:
+        old, new = verdicts[old_idx], verdicts[new_idx]
+        rows.append({
+            'bacteria': bacteria[bacteria_idx],
+            'drug': drugs[drug_idx],
+            'from': old,
+            'to': new,
+            'direction': _change_direction(old, new)
+        })
+    return rows
+
+def _change_summary(report, rows):
+    directions = {'upgrade': 0, 'downgrade': 0, 'changed': 0}
+    for row in rows:
+        directions[row['direction']] += 1
+    return {
+        'from': report['from'],
+        'to': report['to'],
+        'generated_at': report.get('generated_at'),
+        'cells_compared': report.get('cells_compared'),
+        'changed': len(rows),
+        'directions': directions
+    }
+
+# 跨版本结论变化API：不带from/to时列出所有已生成的报告及变化数量（各版本间的变化趋势），
+# 带from/to时返回逐格变化，可按bacteria（模糊匹配）、drug、drug_class、direction过滤
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    try:
+        from_edition = request.args.get('from', '').strip()
+        to_edition = request.args.get('to', '').strip()
+        report_files = sorted(name for name in os.listdir(CHANGES_DIR) if name.endswith('.json')) \
+            if os.path.isdir(CHANGES_DIR) else []
+        
+        if not from_edition and not to_edition:
+            summaries = [_change_summary(*_load_change_report(name)) for name in report_files]
+            summaries.sort(key=lambda item: item.get('generated_at') or '')
+            return jsonify({'success': True, 'reports': summaries, 'total': len(summaries)})
+        
+        if not from_edition or not to_edition:
+            return jsonify({'success': False, 'error': '请同时提供from和to参数'}), 400
+        
+        file_name = f"{from_edition}..{to_edition}.json"
+        if file_name not in report_files:
+            logger.info(f"变化报告API: 未找到报告 {file_name}")
+            return jsonify({'success': False, 'error': f'未找到版本 {from_edition} 到 {to_edition} 的变化报告'}), 404
+        
+        report, rows = _load_change_report(file_name)
+        summary = _change_summary(report, rows)
+        
+        bacteria_term = normalize_search_term(request.args.get('bacteria', '').strip())
+        drug_name = request.args.get('drug', '').strip()
+        drug_class = request.args.get('drug_class', '').strip()
+        direction = request.args.get('direction', '').strip().lower()
+        if direction and direction not in summary['directions']:
+            return jsonify({'success': False, 'error': '参数direction必须为upgrade、downgrade或changed'}), 400
+        
+        class_members = None
+        if drug_class:
+            class_members = set(data_store.drug_classes().get(drug_class, [])) if data_store else set()
+        
+        filtered = [
+            row for row in rows
+            if (not bacteria_term or bacteria_term in normalize_search_term(row['bacteria']))
+            and (not drug_name or row['drug'] == drug_name)
+            and (class_members is None or row['drug'] in class_members)
+            and (not direction or row['direction'] == direction)
+        ]
+        
+        return jsonify({
+            'success': True,
+            'summary': summary,
+            'renamed': report.get('renamed', {}),
+            'added': report.get('added', {}),
+            'removed': report.get('removed', {}),
+            'changes': filtered,
+            'total': len(filtered)
+        })
+    except Exception as e:
+        logger.error(f"变化报告API出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '获取变化报告时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
+
+# 比较多个细菌：返回比较结果，找不到某个细菌时返回 {'missing_index': 序号}
+def _compare_bacteria_results(store, bacteria_names):
     results = {
         'success': True,
         'bacteria': [],  # 将在下面填充找到的实际细菌名称
@@ -393,33 +1462,25 @@ def compare_bacteria():
     found_bacteria_names = []  # 存储找到的实际细菌名称
     
     # 为每个细菌获取数据
-    for bacteria_name in bacteria_names:
-        search_term_lower = bacteria_name.lower()
-        found = False
+    for idx, bacteria_name in enumerate(bacteria_names):
+        record = store.find_bacteria(bacteria_name)
         
-        for record in antibiotic_data.get('data', []):
-            record_bacteria = record.get('bacteria', '')
-            normalized_bacteria = record_bacteria.replace('\n', ' ').lower()
-            
-            if search_term_lower in normalized_bacteria or normalized_bacteria.split(' ')[0] in search_term_lower:
-                bacteria_data[record_bacteria] = record.get('antibiotics', {})
-                found_bacteria_names.append(record_bacteria)  # 添加找到的实际细菌名称
-                # 添加所有药物到集合
-                for drug in record.get('antibiotics', {}).keys():
-                    all_drugs.add(drug)
-                found = True
-                break
-        
-        if not found:
-            # 如果找不到某个细菌，返回错误信息
-            return jsonify({'success': False, 'error': f'未找到细菌 "{bacteria_name}" 的记录'})
+        if record is None:
+            return {'missing_index': idx}
+        
+        record_bacteria = record.get('bacteria', '')
+        bacteria_data[record_bacteria] = record.get('antibiotics', {})
+        found_bacteria_names.append(record_bacteria)  # 添加找到的实际细菌名称
+        # 添加所有药物到集合
+        for drug in record.get('antibiotics', {}).keys():
+            all_drugs.add(drug)
     
     # 更新results中的细菌名称列表为找到的实际名称
     results['bacteria'] = found_bacteria_names
     
     # 构建比较数据
     # 按照原始药物列表顺序
-    for drug in antibiotic_data.get('drug_list', []):
+    for drug in store.drug_names():
         if drug in all_drugs:
             drug_data = {'drug': drug, 'bacteria_results': {}}
             for bacteria in found_bacteria_names:  # 使用找到的实际细菌名称
@@ -429,61 +1490,471 @@ def compare_bacteria():
                     drug_data['bacteria_results'][bacteria] = '未知'
             results['comparison_data'].append(drug_data)
     
-    return jsonify(results)
+    return results
 
-# 比较多个药物的API
-@app.route('/api/compare/drug', methods=['GET'])
-def compare_drugs():
-    # 获取查询参数中的药物名称列表
-    drug_names = request.args.getlist('name')
-    
-    if not drug_names or len(drug_names) < 2:
-        return jsonify({'success': False, 'error': '请至少提供两个药物名称'})
-    
-    if not antibiotic_data:
-        return jsonify({'success': False, 'error': '数据未加载'})
-    
+# 比较多个药物：返回比较结果
+def _compare_drugs_results(store, drug_names):
     results = {
         'success': True,
         'drugs': drug_names,
         'comparison_data': []
     }
     
-    # 收集所有涉及的细菌
+    # 收集所有涉及的细菌，以及每个药物对各细菌的敏感性
     all_bacteria = set()
+    drug_data = {}
     
     # 为每个药物获取数据
     for drug_name in drug_names:
-        if 'drug_indexed' in antibiotic_data and drug_name in antibiotic_data['drug_indexed']:
-            for record in antibiotic_data['drug_indexed'][drug_name]:
-                all_bacteria.add(record['bacteria'])
+        drug_data[drug_name] = {}
+        for record in store.drug_results(drug_name) or []:
+            all_bacteria.add(record['bacteria'])
+            drug_data[drug_name].setdefault(record['bacteria'], record['sensitivity'])
     
     # 构建比较数据
-    for bacteria in antibiotic_data.get('bacteria_list', []):
+    for bacteria in store.bacteria_names():
         if bacteria in all_bacteria:
             bacteria_data = {'bacteria': bacteria, 'drug_results': {}}
             
             # 为每个药物查找对该细菌的敏感性
             for drug in drug_names:
-                bacteria_data['drug_results'][drug] = '未知'
-                
-                # 在drug_indexed中查找
-                if 'drug_indexed' in antibiotic_data and drug in antibiotic_data['drug_indexed']:
-                    for record in antibiotic_data['drug_indexed'][drug]:
-                        if record['bacteria'] == bacteria:
-                            bacteria_data['drug_results'][drug] = record['sensitivity']
-                            break
-                
-                # 如果在drug_indexed中找不到，在原始数据中查找
-                if bacteria_data['drug_results'][drug] == '未知':
-                    for record in antibiotic_data.get('data', []):
-                        if record.get('bacteria') == bacteria and drug in record.get('antibiotics', {}):
-                            bacteria_data['drug_results'][drug] = record['antibiotics'][drug]
-                            break
+                bacteria_data['drug_results'][drug] = drug_data[drug].get(bacteria, '未知')
             
             results['comparison_data'].append(bacteria_data)
     
-    return jsonify(results)
+    return results
+
+# 比较结果的输出格式：rows（默认，逐行对象）或columnar（共享的行标签数组 + 每个比较对象一个结论数组）
+COMPARE_FORMATS = ('rows', 'columnar')
+
+def _parse_flag(name):
+    return request.args.get(name, '').lower() in ('1', 'true', 'yes')
+
+def _shape_comparison(results, items_key, row_key, cells_key, transposed_row_key, transposed_cells_key):
+    """按diff_only、transpose、format参数变换比较结果；未指定任何参数时原样返回
+
+    results可能来自查询缓存并被其他请求共享，这里只构造新对象，不修改results。
+    items_key为被比较对象列表的字段，row_key/cells_key为每行的标签和结论字段，
+    transposed_*为行列互换后使用的字段名（与另一种比较API的行格式一致）。
+    """
+    diff_only = _parse_flag('diff_only')
+    transpose = _parse_flag('transpose')
+    output_format = request.args.get('format', 'rows').lower()
+    if not diff_only and not transpose and output_format == 'rows':
+        return results
+    
+    rows = results['comparison_data']
+    if diff_only:
+        # 只保留各比较对象结论不完全相同的行
+        rows = [row for row in rows if len(set(row[cells_key].values())) > 1]
+    labels = [row[row_key] for row in rows]
+    # 每个比较对象一列，与labels一一对应
+    columns = {item: [row[cells_key][item] for row in rows] for item in results[items_key]}
+    
+    if transpose:
+        labels, columns = list(columns), {
+            label: [values[index] for values in columns.values()] for index, label in enumerate(labels)
+        }
+        row_key, cells_key = transposed_row_key, transposed_cells_key
+    
+    shaped = {
+        'success': True,
+        items_key: results[items_key],
+        'diff_only': diff_only,
+        'transposed': transpose,
+        'format': output_format,
+        'total_rows': len(results['comparison_data'])
+    }
+    if output_format == 'columnar':
+        shaped['row_key'] = row_key
+        shaped['labels'] = labels
+        shaped['columns'] = columns
+    else:
+        shaped['comparison_data'] = [
+            {row_key: label, cells_key: {name: values[index] for name, values in columns.items()}}
+            for index, label in enumerate(labels)
+        ]
+    return shaped
+
+# 比较多个细菌的API
+@app.route('/api/compare/bacteria', methods=['GET'])
+def compare_bacteria():
+    # 获取查询参数中的细菌名称列表
+    bacteria_names = request.args.getlist('name')
+    
+    if not bacteria_names or len(bacteria_names) < 2:
+        return jsonify({'success': False, 'error': '请至少提供两个细菌名称'})
+    
+    if request.args.get('format', 'rows').lower() not in COMPARE_FORMATS:
+        return jsonify({'success': False, 'error': '参数format必须为rows或columnar'}), 400
+    
+    store = site_store()
+    if not store:
+        return jsonify({'success': False, 'error': '数据未加载'})
+    
+    # 细菌匹配不区分大小写，按规范化后的搜索词合并相同的查询
+    timing = []
+    cache_key = ('compare_bacteria', site_data_version(), tuple(normalize_search_term(name) for name in bacteria_names))
+    results = query_cache.get_or_compute(cache_key, timed_compute(lambda: _compare_bacteria_results(store, bacteria_names), timing))
+    if store is data_store:
+        shadow_verifier.submit('compare_bacteria', bacteria_names, results, compute_ms(timing), store)
+    
+    if 'missing_index' in results:
+        # 如果找不到某个细菌，返回错误信息
+        bacteria_name = bacteria_names[results['missing_index']]
+        return jsonify({'success': False, 'error': f'未找到细菌 "{bacteria_name}" 的记录'})
+    
+    return jsonify(_shape_comparison(results, 'bacteria', 'drug', 'bacteria_results', 'bacteria', 'drug_results'))
+
+# 比较多个药物的API
+@app.route('/api/compare/drug', methods=['GET'])
+def compare_drugs():
+    # 获取查询参数中的药物名称列表
+    drug_names = request.args.getlist('name')
+    
+    if not drug_names or len(drug_names) < 2:
+        return jsonify({'success': False, 'error': '请至少提供两个药物名称'})
+    
+    if request.args.get('format', 'rows').lower() not in COMPARE_FORMATS:
+        return jsonify({'success': False, 'error': '参数format必须为rows或columnar'}), 400
+    
+    store = site_store()
+    if not store:
+        return jsonify({'success': False, 'error': '数据未加载'})
+    
+    timing = []
+    cache_key = ('compare_drug', site_data_version(), tuple(drug_names))
+    results = query_cache.get_or_compute(cache_key, timed_compute(lambda: _compare_drugs_results(store, drug_names), timing))
+    if store is data_store:
+        shadow_verifier.submit('compare_drug', drug_names, results, compute_ms(timing), store)
+    
+    return jsonify(_shape_comparison(results, 'drugs', 'bacteria', 'drug_results', 'drug', 'bacteria_results'))
+
+# 性能剖析管理API：查看各路由的热点函数汇总与最近的剖析记录，或调整抽样设置
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+@admin_required
+def profiling_admin():
+    try:
+        if request.method == 'POST':
+            settings = request.get_json(silent=True) or {}
+            interval_ms = settings.get('interval_ms')
+            request_profiler.configure(
+                sample_rate=settings.get('sample_rate'),
+                ring_size=settings.get('ring_size'),
+                interval=interval_ms / 1000 if interval_ms is not None else None
+            )
+            if settings.get('reset'):
+                request_profiler.reset()
+            logger.info(f"性能剖析设置已更新: 抽样比例={request_profiler.sample_rate}")
+        
+        return jsonify({
+            'success': True,
+            'enabled': request_profiler.enabled,
+            'sample_rate': request_profiler.sample_rate,
+            'ring_size': request_profiler.ring_size,
+            'interval_ms': request_profiler.interval * 1000,
+            'routes': request_profiler.summary(),
+            'recent': request_profiler.recent()
+        })
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': '剖析设置参数无效', 'details': str(e)}), 400
+    except Exception as e:
+        logger.error(f"性能剖析管理API出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '获取性能剖析信息时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
+
+# 下载单次剖析的折叠栈文件，可直接用flamegraph.pl或speedscope生成火焰图
+@app.route('/api/admin/profiling/<int:slot>', methods=['GET'])
+@admin_required
+def profiling_download(slot):
+    if not request_profiler.has_slot(slot) or not os.path.exists(request_profiler.slot_path(slot)):
+        return jsonify({'success': False, 'error': '剖析记录不存在'}), 404
+    return send_file(request_profiler.slot_path(slot), mimetype='text/plain',
+                     as_attachment=True, download_name=f"profile-{slot:03d}.folded")
+
+# 内存诊断API：各数据结构的深度大小、进程RSS和tracemalloc分配统计
+@app.route('/api/debug/memory', methods=['GET', 'POST'])
+@admin_required
+def debug_memory():
+    """GET返回内存报告；POST {"action": "start"|"stop"|"snapshot"} 控制tracemalloc，
+    snapshot记录基准快照，之后的报告附带相对于快照的增量"""
+    try:
+        if request.method == 'POST':
+            action = (request.get_json(silent=True) or {}).get('action')
+            if action == 'start':
+                allocation_tracker.start()
+            elif action == 'stop':
+                allocation_tracker.stop()
+            elif action == 'snapshot':
+                if not allocation_tracker.tracing:
+                    return jsonify({'success': False, 'error': '请先开启tracemalloc'}), 400
+                allocation_tracker.snapshot()
+            else:
+                return jsonify({'success': False, 'error': 'action必须为start、stop或snapshot'}), 400
+            logger.info(f"内存诊断: 执行 {action}")
+        
+        try:
+            top = min(max(int(request.args.get('top', 10)), 1), 100)
+        except ValueError:
+            return jsonify({'success': False, 'error': '参数top必须为整数'}), 400
+        
+        # 先采集tracemalloc快照，避免统计深度大小时的临时分配混入结果
+        allocations = allocation_tracker.report(top)
+        
+        editions = {}
+        if data_store is not None:
+            structures = data_store.sizeof_parts()
+            seen = set()
+            editions[data_store.edition] = {
+                'backend': data_store.backend,
+                'structures': {name: deep_sizeof(value) for name, value in structures.items()},
+                # 合计时共享的对象只计算一次
+                'total': sum(deep_sizeof(value, seen) for value in structures.values())
+            }
+            if data_store.backend == 'sqlite':
+                editions[data_store.edition]['db_file_size'] = os.path.getsize(data_store.db_path)
+                editions[data_store.edition]['connection_pool'] = data_store.pool_stats()
+        
+        return jsonify({
+            'success': True,
+            'data_version': data_version,
+            'process_rss': process_rss(),
+            'editions': editions,
+            'indexes': {
+                'similarity_index': deep_sizeof(similarity_index),
+                'rollup_index': deep_sizeof(rollup_index),
+                'local_susceptibility': deep_sizeof(local_susceptibility),
+                'site_overlays': {site: deep_sizeof(overlay) for site, overlay in site_overlays.items()}
+            },
+            'caches': {
+                'query_cache': dict(query_cache.stats(), bytes=deep_sizeof(query_cache.items_snapshot()))
+            },
+            'tracemalloc': allocations
+        })
+    except Exception as e:
+        logger.error(f"内存诊断API出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '获取内存信息时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
+
+# 影子验证管理API：查看各路由的一致/不一致次数和新旧实现的平均耗时，或调整抽样比例
+@app.route('/api/admin/shadow', methods=['GET', 'POST'])
+@admin_required
+def shadow_admin():
+    try:
+        if request.method == 'POST':
+            settings = request.get_json(silent=True) or {}
+            if settings.get('sample_rate') is not None:
+                shadow_verifier.configure(settings['sample_rate'])
+            if settings.get('reset'):
+                shadow_verifier.reset()
+            logger.info(f"影子验证设置已更新: 抽样比例={shadow_verifier.sample_rate}")
+        
+        return jsonify({
+            'success': True,
+            'enabled': shadow_verifier.enabled,
+            'sample_rate': shadow_verifier.sample_rate,
+            'routes': shadow_verifier.metrics()
+        })
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': '影子验证设置参数无效', 'details': str(e)}), 400
+    except Exception as e:
+        logger.error(f"影子验证管理API出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '获取影子验证信息时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
+
+# 数据变更事件流（Server-Sent Events）：连接建立时先发送当前数据版本（hello），
+# 之后在数据版本或热病版次变化时推送data_version / edition事件；支持Last-Event-ID断线补发。
+# 开启事件流服务时重定向到其端口（EventSource会跟随重定向），未开启LIVE_UPDATES时返回204
+@app.route('/api/events', methods=['GET'])
+def data_events():
+    if not LIVE_UPDATES:
+        return Response(status=204)
+    if EVENTS_PORT > 0:
+        return redirect(events_url(), code=307)
+    try:
+        last_event_id = request.headers.get('Last-Event-ID', type=int)
+        subscription = event_broadcaster.subscribe(last_event_id, events_hello())
+        if subscription is None:
+            logger.warning("事件订阅数已达上限，拒绝新的订阅")
+            response = jsonify({'success': False, 'error': '订阅连接数已达上限，请稍后重试'})
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        
+        return Response(subscription, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            # 关闭Nginx等反向代理的响应缓冲，保证事件即时送达
+            'X-Accel-Buffering': 'no'
+        })
+    except Exception as e:
+        logger.error(f"事件订阅API出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '建立事件订阅时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
+
+# 数据重新加载API：重新读取数据文件，可选切换到数据库中的其他热病版次（仅sqlite模式）
+@app.route('/api/admin/reload', methods=['POST'])
+@admin_required
+def reload_data():
+    global selected_edition
+    try:
+        settings = request.get_json(silent=True) or {}
+        edition = settings.get('edition')
+        if edition:
+            if data_store is None or data_store.backend != 'sqlite':
+                return jsonify({'success': False, 'error': '只有sqlite存储模式支持切换版本'}), 400
+            if edition not in data_store.editions():
+                return jsonify({'success': False, 'error': f'数据库中不存在版本: {edition}'}), 400
+            selected_edition = edition
+        
+        # 通知其他工作进程（需开启DATA_WATCH_INTERVAL）切换到同一版次
+        write_reload_signal(selected_edition)
+        if not load_data():
+            error = '重新加载数据失败，继续使用原有数据' if data_store is not None else '重新加载数据失败'
+            return jsonify({'success': False, 'error': error}), 500
+        return jsonify({
+            'success': True,
+            'data_version': data_version,
+            'edition': data_store.edition,
+            'propagated': DATA_WATCH_INTERVAL > 0,
+            'events': dict(event_broadcaster.stats(), server=event_server.stats() if event_server else None)
+        })
+    except Exception as e:
+        logger.error(f"重新加载数据API出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '重新加载数据时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
+
+# 批量查询API：在一个请求中执行多个只读GET查询，减少客户端的往返次数。
+# 请求体为 {"requests": [{"path": "/api/search/bacteria", "params": {"name": "..."}, "etag": "..."}]}，
+# 按顺序返回每个子请求的状态码、ETag和响应体（304时不含响应体）
+@app.route('/api/batch', methods=['POST'])
+def batch_query():
+    try:
+        payload = request.get_json(silent=True) or {}
+        sub_requests = payload.get('requests')
+        if not isinstance(sub_requests, list) or not sub_requests:
+            return jsonify({'success': False, 'error': '请提供requests列表'}), 400
+        if len(sub_requests) > BATCH_MAX_REQUESTS:
+            return jsonify({'success': False, 'error': f'单次批量查询最多包含 {BATCH_MAX_REQUESTS} 个请求'}), 400
+        
+        # 先校验全部子请求，校验失败的子请求直接给出400结果，不分派也不计入限流
+        responses = []
+        for item in sub_requests:
+            path = item.get('path', '') if isinstance(item, dict) else ''
+            if not (path in ETAG_PATHS or path.startswith(ETAG_PREFIXES)):
+                responses.append({'status': 400, 'body': {'success': False, 'error': f'不支持批量查询的路径: {path}'}})
+                continue
+            params = item.get('params')
+            if params is not None and not isinstance(params, dict):
+                responses.append({'status': 400, 'body': {'success': False, 'error': 'params必须为对象'}})
+                continue
+            responses.append(None)
+        
+        # 子请求在当前进程内直接分派，不经过准入控制中间件，因此按其中的耗时子请求个数扣除客户端令牌；
+        # 批量请求本身已在中间件中扣除1个
+        cost = sum(1 for item, entry in zip(sub_requests, responses)
+                   if entry is None and request_priority(item['path']) == PRIORITY_EXPENSIVE) - 1
+        wait = rate_limiter.consume(request.remote_addr or '', cost) if rate_limiter.enabled else 0
+        if wait:
+            logger.warning(f"客户端批量查询过于频繁: {request.remote_addr} 共 {cost + 1} 个耗时子请求")
+            response = jsonify({'success': False, 'error': '请求过于频繁，请稍后重试'})
+            response.headers['Retry-After'] = str(max(int(math.ceil(wait)), 1))
+            return response, 429
+        
+        for index, item in enumerate(sub_requests):
+            if responses[index] is not None:
+                continue
+            headers = {'If-None-Match': item['etag']} if item.get('etag') else {}
+            # 未单独指定院区的子请求使用批量请求的site参数
+            params = dict(item.get('params') or {})
+            if current_site():
+                params.setdefault('site', current_site())
+            # 子请求在当前进程内直接分派，不经过准入控制，避免批量请求占用多个处理槽位
+            with app.test_request_context(item['path'], method='GET', query_string=params, headers=headers):
+                sub_response = app.full_dispatch_request()
+            
+            entry = {'status': sub_response.status_code, 'etag': sub_response.headers.get('ETag')}
+            if sub_response.status_code != 304:
+                entry['body'] = sub_response.get_json(silent=True)
+            responses[index] = entry
+        
+        logger.info(f"批量查询: 共 {len(responses)} 个子请求")
+        return jsonify({'success': True, 'data_version': site_data_version(), 'responses': responses})
+    except Exception as e:
+        logger.error(f"批量查询API出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '批量查询时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
+
+# 院区覆盖层管理API：查看各院区的覆盖条目数和无法对应的条目，POST时重新读取覆盖文件
+@app.route('/api/admin/overlays', methods=['GET', 'POST'])
+@admin_required
+def overlays_admin():
+    try:
+        if request.method == 'POST':
+            if data_store is None:
+                return jsonify({'success': False, 'error': '数据未加载'}), 500
+            if not load_site_overlays():
+                return jsonify({'success': False, 'error': '重新读取院区覆盖层失败'}), 500
+        
+        return jsonify({
+            'success': True,
+            'directory': OVERLAY_DIR,
+            'sites': [dict(overlay.info(), bytes=deep_sizeof(overlay)) for overlay in site_overlays.values()]
+        })
+    except Exception as e:
+        logger.error(f"院区覆盖层管理API出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '获取院区覆盖层信息时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
+
+# 准入控制管理API：查看当前并发、排队和拒绝计数，或调整限流参数
+@app.route('/api/admin/admission', methods=['GET', 'POST'])
+@admin_required
+def admission_admin():
+    try:
+        if request.method == 'POST':
+            settings = request.get_json(silent=True) or {}
+            admission_controller.configure(
+                max_concurrent=settings.get('max_concurrent'),
+                max_queue=settings.get('max_queue'),
+                queue_timeout=settings['queue_timeout_ms'] / 1000 if settings.get('queue_timeout_ms') is not None else None,
+                reserved=settings.get('reserved')
+            )
+            rate_limiter.configure(rate=settings.get('rate_limit_per_sec'), burst=settings.get('rate_limit_burst'))
+            logger.info(f"准入控制设置已更新: {admission_controller.stats()}, 限流: {rate_limiter.stats()}")
+        
+        return jsonify({
+            'success': True,
+            'admission': admission_controller.stats(),
+            'rate_limit': rate_limiter.stats()
+        })
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': '准入控制设置参数无效', 'details': str(e)}), 400
+    except Exception as e:
+        logger.error(f"准入控制管理API出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': '获取准入控制信息时发生错误',
+            'details': str(e) if app.config['DEBUG'] else None
+        }), 500
 
 # 全局错误处理
 @app.errorhandler(Exception)
@@ -500,12 +1971,14 @@ def handle_exception(e):
 def health_check():
     """应用健康检查端点，用于监控系统状态"""
     try:
-        data_loaded = antibiotic_data is not None
+        data_loaded = data_store is not None
         status = 'healthy' if data_loaded else 'degraded'
         
         return jsonify({
             'status': status,
             'data_loaded': data_loaded,
+            'data_version': data_version,
+            'startup_ms': startup_report,
             'timestamp': datetime.now().isoformat(),
             'version': '1.0.0'
         }), 200 if data_loaded else 503
@@ -557,6 +2030,14 @@ def log_request_info():
     logger.info(f"接收到请求: {request.method} {request.path}")
     logger.debug(f"请求参数: {dict(request.args)}")
 
+# 指定了未配置的院区时返回404，而不是静默地返回基础数据
+@app.before_request
+def check_site():
+    site = current_site()
+    if site and request.path.startswith('/api/') and site not in site_overlays:
+        logger.warning(f"未找到院区覆盖配置: {site}")
+        return jsonify({'success': False, 'error': f'未找到院区覆盖配置: {site}'}), 404
+
 # 响应后处理
 @app.after_request
 def after_request(response):
@@ -571,34 +2052,52 @@ def after_request(response):
         logger.warning(f"请求响应: {request.path} {response.status_code}")
     else:
         logger.debug(f"请求响应: {request.path} {response.status_code}")
-        
+    
+    # 数据版本标识，客户端据此判断本地缓存是否需要整体失效
+    if request.path.startswith('/api/') and data_version:
+        response.headers['X-Data-Version'] = site_data_version()
+
+    if (request.method == 'GET' and response.status_code == 200 and response.mimetype == 'application/json'
+            and (request.path in ETAG_PATHS or request.path.startswith(ETAG_PREFIXES))):
+        response.add_etag()
+        response.make_conditional(request)
+
+    # 记录可缓存查询的访问日志，用于启动时预热缓存
+    if request.path in CACHED_QUERY_PATHS and not request.headers.get(WARMUP_HEADER):
+        access_logger.info(f"{time.time():.0f}\t{response.status_code}\t{request.full_path}")
+    
     return response
 
 # 已在前面定义了before_request，这里省略重复的定义
 def before_request():
     logger.info(f"接收到请求: {request.method} {request.path}")
     # 检查数据是否已加载，如果未加载则尝试加载
-    global antibiotic_data
-    if antibiotic_data is None:
+    global data_store
+    if data_store is None:
         load_data()
 
 # 应用启动时加载数据
 # 支持通过WSGI服务器启动（如Gunicorn、uWSGI等）
-# 初始化时加载数据
+# 初始化时加载数据，每份数据只加载一次；直接运行时不再重复加载
+_startup_phase('app_setup')
+apply_reload_signal(read_reload_signal())
 load_data()
+start_data_watcher()
+start_event_server()
+_startup_phase('load_data')
+startup_report['total'] = round((time.perf_counter() - _startup_began) * 1000, 1)
+logger.info("启动耗时(ms): " + ", ".join(f"{name}={elapsed}" for name, elapsed in startup_report.items())
+            + f"，派生索引预热方式: {INDEX_WARMUP}")
 
 # 直接运行时的配置
 if __name__ == '__main__':
     try:
-        # 启动前加载数据
-        load_data()
-        
         # 获取环境变量中的配置
         port = int(os.environ.get('PORT', 5000))
         debug_mode = os.environ.get('DEBUG', 'False').lower() == 'true'
         
         logger.info(f"启动抗生素查询服务，端口: {port}, 调试模式: {debug_mode}")
-        logger.info(f"数据加载完成，共 {len(antibiotic_data.get('data', [])) if antibiotic_data else 0} 种细菌")
+        logger.info(f"数据加载完成，共 {data_store.record_count() if data_store else 0} 种细菌")
         
         # 启动Flask应用 - 生产环境配置增强
         app.run(
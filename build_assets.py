@@ -0,0 +1,218 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import urllib.parse
+import urllib.request
+
+# 静态资源构建：将index.html引用的CDN资源下载到本地（医院内网常无法访问外部CDN），
+# 把内联的样式和脚本拆成独立文件，所有文件名带内容指纹并预先压缩（gzip，安装了brotli时另生成.br），
+# 生成的页面写入templates/index.html，资源写入assets/，由app.py以长期缓存的方式提供。
+# 构建先写入临时目录，全部成功后才与页面一起替换正在使用的版本，构建失败时原有资源和页面保持不变
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+source_html = os.path.join(base_dir, 'index.html')
+vendor_dir = os.path.join(base_dir, 'vendor')
+assets_dir = os.path.join(base_dir, 'assets')
+template_path = os.path.join(base_dir, 'templates', 'index.html')
+
+# 页面中引用资源的URL前缀，与app.py中的静态资源路由一致
+ASSETS_URL = '/assets/'
+
+# 指纹长度（内容SHA-256的前若干位）
+FINGERPRINT_LENGTH = 10
+
+# 只压缩文本类资源；woff/woff2等本身已压缩的格式不再处理
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ttf', '.eot', '.otf', '.json')
+
+_LINK_TAG = re.compile(r'<link\b[^>]*\bhref="(https?://[^"]+)"[^>]*>')
+_SCRIPT_TAG = re.compile(r'<script\b[^>]*\bsrc="(https?://[^"]+)"[^>]*>\s*</script>')
+_INLINE_STYLE = re.compile(r'<style>(.*?)</style>', re.S)
+_INLINE_SCRIPT = re.compile(r'<script>(.*?)</script>', re.S)
+_CSS_URL = re.compile(r'url\(\s*[\'"]?([^\'")]+)[\'"]?\s*\)')
+
+def fingerprinted_name(name, content):
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.sha256(content).hexdigest()[:FINGERPRINT_LENGTH]
+    return f"{stem}.{digest}{ext}"
+
+def vendor_path(url):
+    """
+    CDN资源在vendor目录中的缓存位置，保留主机名和路径，便于核对版本
+    """
+    parsed = urllib.parse.urlsplit(url)
+    return os.path.join(vendor_dir, parsed.netloc, parsed.path.lstrip('/'))
+
+def fetch(url, offline=False):
+    """
+    读取CDN资源：优先使用vendor目录中已下载的文件，没有时下载并保存（offline时不下载）
+    """
+    path = vendor_path(url)
+    if not os.path.exists(path):
+        if offline:
+            raise FileNotFoundError(f"vendor目录中没有该资源，请先在可访问外网的环境中构建: {url}")
+        print(f"下载: {url}")
+        with urllib.request.urlopen(url, timeout=30) as response:
+            content = response.read()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+    with open(path, 'rb') as f:
+        return f.read()
+
+class AssetWriter:
+    """
+    写入带指纹的资源文件并生成预压缩版本，记录 逻辑名称->指纹文件名 的清单
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.manifest = {}
+        self.has_brotli = False
+        try:
+            import brotli
+            self._brotli = brotli
+            self.has_brotli = True
+        except ImportError:
+            self._brotli = None
+
+    def write(self, name, content):
+        file_name = fingerprinted_name(name, content)
+        path = os.path.join(self.output_dir, file_name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        if file_name.endswith(COMPRESSIBLE):
+            self._precompress(path, content)
+        self.manifest[name] = file_name
+        return ASSETS_URL + file_name
+
+    def _precompress(self, path, content):
+        # 压缩后没有明显变小的文件不保留压缩版本
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) < len(content) * 0.9:
+            with open(path + '.gz', 'wb') as f:
+                f.write(compressed)
+        if self._brotli is not None:
+            compressed = self._brotli.compress(content, quality=11)
+            if len(compressed) < len(content) * 0.9:
+                with open(path + '.br', 'wb') as f:
+                    f.write(compressed)
+
+def build_css(url, writer, offline):
+    """
+    处理CDN样式表：其中url()引用的字体等文件一并下载、加指纹，并改写为指纹后的地址
+    """
+    css = fetch(url, offline).decode('utf-8')
+
+    def replace(match):
+        reference = match.group(1)
+        if reference.startswith('data:'):
+            return match.group(0)
+        # 去掉?v=4.7.0、#iefix等后缀得到实际文件，改写时保留片段标识
+        absolute = urllib.parse.urljoin(url, reference)
+        parsed = urllib.parse.urlsplit(absolute)
+        file_url = urllib.parse.urlunsplit((parsed.scheme, parsed.netloc, parsed.path, '', ''))
+        asset_url = writer.write(os.path.basename(parsed.path), fetch(file_url, offline))
+        fragment = f"#{parsed.fragment}" if parsed.fragment else ''
+        return f"url('{asset_url}{fragment}')"
+
+    return _CSS_URL.sub(replace, css).encode('utf-8')
+
+def swap_in(staging_dir, staging_template):
+    """
+    用构建好的临时目录和页面替换assets/与templates/index.html；
+    目录先改名再删除旧版本，页面用os.replace原子替换，不会出现只写了一半的页面
+    """
+    retired_dir = None
+    if os.path.isdir(assets_dir):
+        retired_dir = staging_dir + '-old'
+        os.rename(assets_dir, retired_dir)
+    os.rename(staging_dir, assets_dir)
+    os.replace(staging_template, template_path)
+    if retired_dir is not None:
+        shutil.rmtree(retired_dir, ignore_errors=True)
+
+def build_assets(offline=False, clean=True):
+    """
+    从index.html生成templates/index.html和assets/目录
+    """
+    staging_dir = None
+    staging_template = None
+    try:
+        with open(source_html, 'r', encoding='utf-8') as f:
+            html = f.read()
+
+        # 临时目录与目标位于同一目录下，保证最后的改名在同一文件系统内完成
+        staging_dir = tempfile.mkdtemp(prefix='.assets-', dir=base_dir)
+        if not clean and os.path.isdir(assets_dir):
+            shutil.copytree(assets_dir, staging_dir, dirs_exist_ok=True)
+        writer = AssetWriter(staging_dir)
+
+        # CDN样式表与脚本
+        def replace_link(match):
+            url = match.group(1)
+            name = os.path.basename(urllib.parse.urlsplit(url).path)
+            return match.group(0).replace(url, writer.write(name, build_css(url, writer, offline)))
+
+        def replace_script(match):
+            url = match.group(1)
+            name = os.path.basename(urllib.parse.urlsplit(url).path)
+            return match.group(0).replace(url, writer.write(name, fetch(url, offline)))
+
+        html = _LINK_TAG.sub(replace_link, html)
+        html = _SCRIPT_TAG.sub(replace_script, html)
+
+        # 内联样式与脚本拆分为独立文件，按出现顺序命名
+        counters = {'css': 0, 'js': 0}
+
+        def extract(kind, template):
+            def replace(match):
+                counters[kind] += 1
+                suffix = '' if counters[kind] == 1 else f"-{counters[kind]}"
+                content = match.group(1).strip('\r\n').encode('utf-8')
+                return template.format(url=writer.write(f"app{suffix}.{kind}", content))
+            return replace
+
+        html = _INLINE_STYLE.sub(extract('css', '<link href="{url}" rel="stylesheet">'), html)
+        html = _INLINE_SCRIPT.sub(extract('js', '<script src="{url}"></script>'), html)
+
+        with open(os.path.join(staging_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(writer.manifest, f, ensure_ascii=False, indent=2)
+
+        os.makedirs(os.path.dirname(template_path), exist_ok=True)
+        staging_template = template_path + '.tmp'
+        with open(staging_template, 'w', encoding='utf-8', newline='') as f:
+            f.write(html)
+
+        swap_in(staging_dir, staging_template)
+        staging_dir = staging_template = None
+
+        print(f"已生成 {len(writer.manifest)} 个资源文件至: {assets_dir}")
+        if not writer.has_brotli:
+            print("未安装brotli，只生成gzip压缩版本")
+        print(f"页面已保存至: {template_path}")
+        return writer.manifest
+
+    except Exception as e:
+        print(f"构建静态资源时出错，原有资源和页面未改动: {e}", file=sys.stderr)
+        return None
+
+    finally:
+        if staging_dir is not None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        if staging_template is not None and os.path.exists(staging_template):
+            os.remove(staging_template)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='本地化CDN资源，拆分内联样式和脚本，生成带指纹的预压缩静态资源')
+    parser.add_argument('--offline', action='store_true', help='只使用vendor目录中已下载的资源，不访问网络')
+    parser.add_argument('--no-clean', action='store_true', help='保留assets目录中旧版本的资源文件')
+    args = parser.parse_args()
+
+    result = build_assets(offline=args.offline, clean=not args.no_clean)
+    sys.exit(0 if result is not None else 1)
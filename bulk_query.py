@@ -0,0 +1,173 @@
+import pandas as pd
+import argparse
+import collections
+import multiprocessing
+import os
+import sys
+import time
+from storage import JsonStore, SqliteStore, normalize_search_term
+
+# 离线批量查询：为微生物室工作清单的每一行(细菌, 药物)标注指南结论，
+# 分块读取CSV并在进程池中并行处理，按输入顺序流式写出结果
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+# 每个分块的行数，也是分发给子进程的任务粒度
+DEFAULT_CHUNK_SIZE = 20000
+
+# 找不到细菌或药物时的结论，与比较API一致
+UNKNOWN_VERDICT = '未知'
+
+# 子进程中的数据存储与细菌名称解析缓存（工作清单中同一细菌会大量重复出现）
+_store = None
+_resolved = {}
+
+def open_store():
+    """
+    按与app.py的load_data相同的环境变量打开数据：ANTIBIOTIC_STORAGE、ANTIBIOTIC_DATA_PATH、
+    ANTIBIOTIC_DB_PATH、ANTIBIOTIC_EDITION
+    """
+    backend = os.environ.get('ANTIBIOTIC_STORAGE', 'json').lower()
+    edition = os.environ.get('ANTIBIOTIC_EDITION', '')
+    if backend == 'sqlite':
+        db_path = os.path.join(base_dir, os.environ.get('ANTIBIOTIC_DB_PATH', 'antibiotic_data.db'))
+        return SqliteStore(db_path, edition or None)
+    data_path = os.path.join(base_dir, os.environ.get('ANTIBIOTIC_DATA_PATH', 'antibiotic_data.json'))
+    return JsonStore.from_file(data_path, edition or 'default')
+
+def init_worker():
+    """
+    子进程初始化：fork启动时直接沿用父进程已加载的只读JSON数据（写时复制，不重复占用内存）；
+    SQLite连接不能跨进程使用，spawn启动时也没有父进程的数据，这两种情况在子进程中重新打开
+    """
+    global _store
+    if _store is None or _store.backend == 'sqlite':
+        _store = open_store()
+
+def resolve_organism(organism):
+    """
+    按细菌搜索API的匹配规则解析自由文本的细菌名称，返回 (记录中的细菌名称, 药物结论字典)
+    """
+    key = normalize_search_term(organism)
+    if key not in _resolved:
+        record = _store.find_bacteria(organism) if key.strip() else None
+        _resolved[key] = (record.get('bacteria', ''), record.get('antibiotics', {})) if record else None
+    return _resolved[key]
+
+def annotate_chunk(chunk, organism_col, drug_col):
+    """
+    为一个分块添加matched_bacteria、verdict、match_status三列，返回 (分块, 处理耗时秒)
+    """
+    started = time.perf_counter()
+    matched = []
+    verdicts = []
+    statuses = []
+    for organism, drug in zip(chunk[organism_col].fillna(''), chunk[drug_col].fillna('')):
+        resolved = resolve_organism(str(organism).strip())
+        if resolved is None:
+            matched.append('')
+            verdicts.append(UNKNOWN_VERDICT)
+            statuses.append('organism_not_found')
+            continue
+        bacteria, antibiotics = resolved
+        matched.append(bacteria)
+        drug = str(drug).strip()
+        if drug in antibiotics:
+            verdicts.append(antibiotics[drug])
+            statuses.append('ok')
+        else:
+            verdicts.append(UNKNOWN_VERDICT)
+            statuses.append('drug_not_found')
+
+    chunk = chunk.copy()
+    chunk['matched_bacteria'] = matched
+    chunk['verdict'] = verdicts
+    chunk['match_status'] = statuses
+    return chunk, time.perf_counter() - started
+
+def _annotate_task(task):
+    chunk, organism_col, drug_col = task
+    return annotate_chunk(chunk, organism_col, drug_col)
+
+def ordered_results(pool, tasks, window):
+    """
+    按提交顺序返回各分块的结果，同时最多有window个分块在处理或等待输出；
+    取出最早的结果后才读取下一个分块，内存占用不随输入文件大小增长
+    """
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(pool.apply_async(_annotate_task, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def output_path_for(csv_path):
+    stem, _ = os.path.splitext(csv_path)
+    return f"{stem}.annotated.csv"
+
+def bulk_query(csv_paths, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, organism_col='organism',
+               drug_col='drug', encoding='utf-8', output_path=None):
+    """
+    逐个处理输入CSV，结果写入 <输入文件名>.annotated.csv（只有一个输入时可用output_path指定，'-'表示标准输出）
+    """
+    global _store
+    try:
+        workers = workers or os.cpu_count() or 1
+        # 在创建进程池之前加载数据，fork启动的子进程直接共享这份只读数据
+        _store = open_store()
+        print(f"数据加载完成，版本 '{_store.edition}'，共 {_store.record_count()} 种细菌，进程数 {workers}",
+              file=sys.stderr)
+
+        total_rows = 0
+        busy_seconds = 0.0
+        started = time.perf_counter()
+        with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+            for csv_path in csv_paths:
+                target = output_path if output_path and len(csv_paths) == 1 else output_path_for(csv_path)
+                reader = pd.read_csv(csv_path, chunksize=chunk_size, dtype=str, encoding=encoding,
+                                     keep_default_na=False)
+                tasks = ((chunk, organism_col, drug_col) for chunk in reader)
+
+                file_rows = 0
+                out = sys.stdout if target == '-' else open(target, 'w', encoding='utf-8', newline='')
+                try:
+                    # 每个进程最多两个分块在途，先完成的分块在缓冲中等待，输出顺序与输入一致
+                    for chunk_idx, (chunk, elapsed) in enumerate(ordered_results(pool, tasks, 2 * workers)):
+                        chunk.to_csv(out, index=False, header=chunk_idx == 0)
+                        file_rows += len(chunk)
+                        busy_seconds += elapsed
+                finally:
+                    if out is not sys.stdout:
+                        out.close()
+
+                total_rows += file_rows
+                print(f"已处理: {csv_path}，共 {file_rows} 行，输出至: {target}", file=sys.stderr)
+
+        elapsed = time.perf_counter() - started
+        throughput = total_rows / elapsed if elapsed > 0 else 0
+        per_core = total_rows / busy_seconds if busy_seconds > 0 else 0
+        print(f"共 {total_rows} 行，耗时 {elapsed:.2f} 秒，总吞吐 {throughput:.0f} 行/秒，"
+              f"单核吞吐 {per_core:.0f} 行/秒（按子进程实际处理时间计算）", file=sys.stderr)
+        return {'rows': total_rows, 'seconds': elapsed, 'rows_per_second': throughput,
+                'rows_per_core_second': per_core}
+
+    except Exception as e:
+        print(f"批量查询过程中出错: {e}", file=sys.stderr)
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='为工作清单中的(细菌, 药物)行批量标注指南结论')
+    parser.add_argument('csv_paths', nargs='+', help='工作清单CSV文件，需包含细菌列和药物列')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认为CPU核数')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='每个分块的行数')
+    parser.add_argument('--organism-col', default='organism', help='细菌名称列')
+    parser.add_argument('--drug-col', default='drug', help='药物名称列')
+    parser.add_argument('--encoding', default='utf-8', help='CSV文件编码')
+    parser.add_argument('--output', default=None, help="输出文件（仅一个输入时有效），'-'表示标准输出")
+    args = parser.parse_args()
+
+    result = bulk_query(args.csv_paths, workers=args.workers, chunk_size=args.chunk_size,
+                        organism_col=args.organism_col, drug_col=args.drug_col,
+                        encoding=args.encoding, output_path=args.output)
+    sys.exit(0 if result is not None else 1)
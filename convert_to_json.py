@@ -5,6 +5,44 @@ import os
 # 文件路径
 file_path = 'e:\\中心医院\\中大附一进修\\32\\53版热病.xlsx'
 output_path = 'e:\\中心医院\\中大附一进修\\32\\antibiotic_data.json'
+# 药物类别/细菌分组定义文件，与本脚本放在同一目录
+taxonomy_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'taxonomy.json')
+
+# 未在分类文件中出现的药物或细菌归入该类别
+UNCLASSIFIED = '未分类'
+
+def group_by_taxonomy(names, taxonomy_groups):
+    """
+    按分类文件将名称归组，组内保持原始Excel顺序，未归类的名称放入"未分类"
+    """
+    group_of = {}
+    for group_name, members in taxonomy_groups.items():
+        for member in members:
+            group_of[member] = group_name
+    
+    grouped = {group_name: [] for group_name in taxonomy_groups}
+    for name in names:
+        grouped.setdefault(group_of.get(name, UNCLASSIFIED), []).append(name)
+    
+    # 去掉在当前数据中没有成员的分组
+    return {group_name: members for group_name, members in grouped.items() if members}
+
+def apply_taxonomy(structured_data):
+    """
+    读取分类文件，将药物类别和细菌分组写入结构化数据
+    """
+    taxonomy = {}
+    if os.path.exists(taxonomy_path):
+        with open(taxonomy_path, 'r', encoding='utf-8') as f:
+            taxonomy = json.load(f)
+    else:
+        print(f"未找到分类文件，所有药物和细菌将归入{UNCLASSIFIED}: {taxonomy_path}")
+    
+    structured_data["drug_classes"] = group_by_taxonomy(
+        structured_data["drug_list"], taxonomy.get("drug_classes", {}))
+    structured_data["bacteria_groups"] = group_by_taxonomy(
+        structured_data["bacteria_list"], taxonomy.get("bacteria_groups", {}))
+    return structured_data
 
 def convert_excel_to_json():
     """
@@ -64,6 +102,9 @@ def convert_excel_to_json():
         # 将按药物索引的数据添加到主数据结构中
         structured_data["drug_indexed"] = drug_indexed_data
         
+        # 添加药物类别和细菌分组，供汇总统计使用
+        apply_taxonomy(structured_data)
+        
         # 保存为JSON文件
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(structured_data, f, ensure_ascii=False, indent=2)
@@ -72,6 +113,7 @@ def convert_excel_to_json():
         print(f"包含细菌种类数: {len(bacteria_list)}")
         print(f"包含药物种类数: {len(drug_list)}")
         print(f"总数据记录数: {len(structured_data['data'])}")
+        print(f"药物类别数: {len(structured_data['drug_classes'])}, 细菌分组数: {len(structured_data['bacteria_groups'])}")
         
         return structured_data
         
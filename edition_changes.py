@@ -0,0 +1,202 @@
+import pandas as pd
+import numpy as np
+import argparse
+import difflib
+import json
+import os
+import re
+import sys
+from collections import Counter
+from datetime import datetime
+
+# 跨版本变化报告：逐格比较两个由convert_to_json.py生成的数据集（如34版与53版热病），
+# 对齐改名的细菌和药物后，将结论发生变化的(细菌, 药物)写入紧凑的变化索引，供 /api/changes 查询
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+# 与app.py中 /api/changes 读取报告的目录一致
+changes_dir = os.path.join(base_dir, os.environ.get('CHANGES_DIR', 'changes'))
+
+# 缺失的单元格（某版本中没有该结论）
+MISSING = '未知'
+
+# 名称模糊匹配的相似度下限，低于该值的不视为改名
+DEFAULT_RENAME_CUTOFF = 0.85
+
+_FULLWIDTH = str.maketrans('（）：，', '():,')
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_name(name):
+    """
+    名称对齐用的规范形式：统一全角括号和标点、合并空白并转为小写
+    """
+    return _WHITESPACE.sub(' ', str(name).translate(_FULLWIDTH)).strip().lower()
+
+def report_path(from_edition, to_edition):
+    return os.path.join(changes_dir, f"{from_edition}..{to_edition}.json")
+
+def duplicated(names):
+    return [name for name, count in Counter(names).items() if count > 1]
+
+def load_matrix(json_path):
+    """
+    读取数据集并转换为 细菌×药物 的结论矩阵，行列顺序与原始Excel一致
+
+    细菌或药物名称重复时无法逐格对齐，抛出ValueError并列出重复的名称
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    bacteria = [record.get('bacteria', '') for record in data.get('data', [])]
+    drugs = data.get('drug_list') or sorted({drug for record in data.get('data', [])
+                                             for drug in record.get('antibiotics', {})})
+    for label, names in (('细菌', bacteria), ('药物', drugs)):
+        duplicates = duplicated(names)
+        if duplicates:
+            raise ValueError(f"{json_path} 中有重复的{label}名称: {', '.join(map(repr, duplicates))}")
+    matrix = pd.DataFrame([record.get('antibiotics', {}) for record in data.get('data', [])],
+                          index=bacteria, columns=drugs)
+    return matrix.fillna(MISSING).astype(str)
+
+def align_names(old_names, new_names, aliases=None, cutoff=DEFAULT_RENAME_CUTOFF):
+    """
+    将旧版本名称对齐到新版本名称，依次使用：完全相同、别名表、规范化后相同、一对一的模糊匹配。
+    返回 (对齐字典 旧->新, 改名字典 旧->新, 删除的旧名称, 新增的新名称)
+    """
+    aliases = aliases or {}
+    new_set = set(new_names)
+    mapping = {}
+    renamed = {}
+
+    for name in old_names:
+        if name in new_set:
+            mapping[name] = name
+        elif aliases.get(name) in new_set:
+            mapping[name] = renamed[name] = aliases[name]
+
+    taken = set(mapping.values())
+    normalized_new = {}
+    for name in new_names:
+        if name not in taken:
+            normalized_new.setdefault(normalize_name(name), name)
+    for name in old_names:
+        if name in mapping:
+            continue
+        match = normalized_new.get(normalize_name(name))
+        if match is not None and match not in taken:
+            mapping[name] = renamed[name] = match
+            taken.add(match)
+
+    # 剩余名称做模糊匹配，只接受双向都是最佳候选的配对，避免多个旧名称对应同一个新名称
+    remaining_old = [name for name in old_names if name not in mapping]
+    remaining_new = [name for name in new_names if name not in taken]
+    normalized_remaining_new = {normalize_name(name): name for name in remaining_new}
+    normalized_remaining_old = {normalize_name(name): name for name in remaining_old}
+    for name in remaining_old:
+        candidates = difflib.get_close_matches(normalize_name(name), list(normalized_remaining_new), n=1, cutoff=cutoff)
+        if not candidates:
+            continue
+        back = difflib.get_close_matches(candidates[0], list(normalized_remaining_old), n=1, cutoff=cutoff)
+        if back and normalized_remaining_old[back[0]] == name:
+            match = normalized_remaining_new.pop(candidates[0])
+            mapping[name] = renamed[name] = match
+
+    removed = [name for name in old_names if name not in mapping]
+    matched_new = set(mapping.values())
+    added = [name for name in new_names if name not in matched_new]
+    return mapping, renamed, removed, added
+
+def diff_editions(old_matrix, new_matrix, bacteria_aliases=None, drug_aliases=None, cutoff=DEFAULT_RENAME_CUTOFF):
+    """
+    对齐行列后在整个矩阵上向量化比较，返回紧凑的变化索引：
+    细菌、药物和结论各存一张名称表，每个变化为 [细菌序号, 药物序号, 旧结论序号, 新结论序号]
+    """
+    bacteria_map, bacteria_renamed, bacteria_removed, bacteria_added = align_names(
+        list(old_matrix.index), list(new_matrix.index), bacteria_aliases, cutoff)
+    drug_map, drug_renamed, drug_removed, drug_added = align_names(
+        list(old_matrix.columns), list(new_matrix.columns), drug_aliases, cutoff)
+
+    # 旧矩阵按新版本的名称重新标注后，与新矩阵取共同的行列（保持新版本的顺序）
+    old_aligned = old_matrix.loc[list(bacteria_map), list(drug_map)]
+    old_aligned.index = [bacteria_map[name] for name in old_aligned.index]
+    old_aligned.columns = [drug_map[name] for name in old_aligned.columns]
+    bacteria = [name for name in new_matrix.index if name in set(old_aligned.index)]
+    drugs = [name for name in new_matrix.columns if name in set(old_aligned.columns)]
+    old_values = old_aligned.loc[bacteria, drugs].to_numpy()
+    new_values = new_matrix.loc[bacteria, drugs].to_numpy()
+
+    # 两个版本共用一张结论编码表，比较整数矩阵
+    verdicts, codes = np.unique(np.concatenate([old_values.ravel(), new_values.ravel()]), return_inverse=True)
+    old_codes = codes[:old_values.size].reshape(old_values.shape)
+    new_codes = codes[old_values.size:].reshape(new_values.shape)
+    rows, cols = np.nonzero(old_codes != new_codes)
+
+    changes = np.stack([rows, cols, old_codes[rows, cols], new_codes[rows, cols]], axis=1)
+    return {
+        'bacteria': bacteria,
+        'drugs': drugs,
+        'verdicts': [str(verdict) for verdict in verdicts],
+        'changes': changes.tolist(),
+        'renamed': {'bacteria': bacteria_renamed, 'drugs': drug_renamed},
+        'added': {'bacteria': bacteria_added, 'drugs': drug_added},
+        'removed': {'bacteria': bacteria_removed, 'drugs': drug_removed},
+        'cells_compared': int(old_codes.size)
+    }
+
+def load_aliases(aliases_path):
+    """
+    别名文件格式：{"bacteria": {"旧名称": "新名称"}, "drugs": {"旧名称": "新名称"}}
+    """
+    if not aliases_path:
+        return {}, {}
+    with open(aliases_path, 'r', encoding='utf-8') as f:
+        aliases = json.load(f)
+    return aliases.get('bacteria', {}), aliases.get('drugs', {})
+
+def build_change_report(old_path, new_path, from_edition, to_edition, aliases_path=None,
+                        cutoff=DEFAULT_RENAME_CUTOFF):
+    """
+    比较两个版本的数据集并原子写入 changes/<旧版本>..<新版本>.json
+    """
+    try:
+        bacteria_aliases, drug_aliases = load_aliases(aliases_path)
+        report = diff_editions(load_matrix(old_path), load_matrix(new_path),
+                               bacteria_aliases, drug_aliases, cutoff)
+        report = dict({
+            'from': from_edition,
+            'to': to_edition,
+            'generated_at': datetime.now().isoformat(),
+            'sources': {'from': os.path.abspath(old_path), 'to': os.path.abspath(new_path)}
+        }, **report)
+
+        os.makedirs(changes_dir, exist_ok=True)
+        target = report_path(from_edition, to_edition)
+        tmp_path = target + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False)
+        os.replace(tmp_path, target)
+
+        print(f"比较了 {report['cells_compared']} 个单元格，{len(report['changes'])} 个结论发生变化")
+        for kind in ('bacteria', 'drugs'):
+            label = '细菌' if kind == 'bacteria' else '药物'
+            print(f"{label}: 改名 {len(report['renamed'][kind])}，新增 {len(report['added'][kind])}，"
+                  f"删除 {len(report['removed'][kind])}")
+        print(f"变化报告已保存至: {target}")
+        return report
+
+    except Exception as e:
+        print(f"生成变化报告时出错: {e}", file=sys.stderr)
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='比较两个版本的抗菌谱数据，生成逐格的结论变化报告')
+    parser.add_argument('old_json', help='旧版本的JSON数据，例如 34/antibiotic_data.json')
+    parser.add_argument('new_json', help='新版本的JSON数据，例如 antibiotic_data.json')
+    parser.add_argument('--from', dest='from_edition', required=True, help='旧版本名称，例如 34')
+    parser.add_argument('--to', dest='to_edition', required=True, help='新版本名称，例如 53')
+    parser.add_argument('--aliases', default=None, help='改名对照表JSON文件')
+    parser.add_argument('--rename-cutoff', type=float, default=DEFAULT_RENAME_CUTOFF,
+                        help='自动识别改名时名称相似度的下限（0-1）')
+    args = parser.parse_args()
+
+    report = build_change_report(args.old_json, args.new_json, args.from_edition, args.to_edition,
+                                 aliases_path=args.aliases, cutoff=args.rename_cutoff)
+    sys.exit(0 if report is not None else 1)
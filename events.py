@@ -0,0 +1,301 @@
+import asyncio
+import json
+import threading
+from collections import deque
+
+# Server-Sent Events广播：所有订阅者共享一个事件序列和一个条件变量，
+# 每个订阅者只保存自己读到的序号，不为每个连接单独维护队列，空闲连接几乎没有额外开销。
+# 订阅连接可以由EventStreamServer在独立端口上用一个asyncio事件循环统一服务（每个连接只是一个非阻塞套接字），
+# 也可以作为WSGI响应体由Web服务器的工作线程逐个服务（每个连接占用一个线程，只适合少量订阅者）
+
+# 建议客户端断线后的重连间隔（毫秒）
+RETRY_FRAME = 'retry: 3000\n\n'
+# 注释行作为心跳，防止代理因空闲断开连接，也用于及时发现已断开的客户端
+HEARTBEAT_FRAME = ': keep-alive\n\n'
+
+
+class EventBroadcaster:
+    """保存最近history_size条事件，供断线重连的客户端按Last-Event-ID补发"""
+
+    def __init__(self, history_size=100, max_subscribers=5000, heartbeat=25.0):
+        self.history_size = history_size
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history_size)
+        self._sequence = 0
+        self._subscribers = 0
+        self._closed = False
+        # 发布事件或关闭时调用的回调（如EventStreamServer唤醒其事件循环），在发布者的线程中调用
+        self._listeners = []
+        self.published = 0
+
+    def add_listener(self, callback):
+        with self._cond:
+            self._listeners.append(callback)
+
+    def publish(self, event, data):
+        with self._cond:
+            self._sequence += 1
+            self._events.append((self._sequence, event, json.dumps(data, ensure_ascii=False)))
+            self.published += 1
+            self._cond.notify_all()
+            sequence = self._sequence
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback()
+        return sequence
+
+    def close(self):
+        """通知所有订阅者结束连接（进程退出时使用）"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def subscribe(self, last_event_id=None, initial=None):
+        """占用一个订阅名额并返回Subscription，已达上限时返回None"""
+        if not self._reserve():
+            return None
+        return Subscription(self, last_event_id, initial)
+
+    def _reserve(self):
+        with self._cond:
+            if self._subscribers >= self.max_subscribers:
+                return False
+            self._subscribers += 1
+            return True
+
+    def _unsubscribe(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    def _pending(self, cursor):
+        """返回序号大于cursor的事件；cursor早于保留的历史时补发全部历史"""
+        return [item for item in self._events if item[0] > cursor]
+
+    def _backlog(self, last_event_id):
+        """新连接的起始序号和需要补发的事件"""
+        with self._cond:
+            cursor = self._sequence
+            if last_event_id is not None:
+                cursor = min(last_event_id, self._sequence)
+            return cursor, self._pending(cursor)
+
+    def _events_after(self, cursor):
+        with self._cond:
+            return self._pending(cursor)
+
+    def _stream(self, last_event_id, initial):
+        cursor, backlog = self._backlog(last_event_id)
+        yield RETRY_FRAME
+        if initial is not None:
+            yield _format(None, initial[0], json.dumps(initial[1], ensure_ascii=False))
+        while True:
+            for sequence, event, data in backlog:
+                cursor = sequence
+                yield _format(sequence, event, data)
+            with self._cond:
+                if not self._closed and self._sequence == cursor:
+                    self._cond.wait(self.heartbeat)
+                if self._closed:
+                    return
+                backlog = self._pending(cursor)
+            if not backlog:
+                yield HEARTBEAT_FRAME
+
+    def stats(self):
+        with self._cond:
+            return {
+                'subscribers': self._subscribers,
+                'max_subscribers': self.max_subscribers,
+                'published': self.published,
+                'last_event_id': self._sequence
+            }
+
+
+class Subscription:
+    """一个订阅连接的SSE文本帧迭代器；WSGI服务器在连接结束时调用close释放订阅名额
+
+    initial为 (event, data)，在连接建立时先发送一次，便于客户端与当前状态对齐。
+    """
+
+    def __init__(self, broadcaster, last_event_id=None, initial=None):
+        self._broadcaster = broadcaster
+        self._frames = broadcaster._stream(last_event_id, initial)
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._frames)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._frames.close()
+        self._broadcaster._unsubscribe()
+
+
+class EventStreamServer:
+    """在独立端口上服务SSE订阅：一个后台线程运行asyncio事件循环，所有订阅连接都是其中的非阻塞套接字
+
+    空闲连接只占用一个套接字和少量内存，不占用线程，单个进程可以保持数千个订阅。
+    广播器发布事件时唤醒事件循环，由事件循环把新事件写给各连接。initial为返回 (event, data) 的函数，
+    在每个连接建立时调用一次。多进程部署时只有一个进程能监听该端口，其余进程每retry_interval秒重试一次，
+    监听端口的进程退出后由其他进程接替。
+    """
+
+    def __init__(self, broadcaster, host, port, path='/api/events', initial=None, logger=None,
+                 retry_interval=30.0, request_timeout=10.0):
+        self.broadcaster = broadcaster
+        self.host = host
+        self.port = port
+        self.path = path
+        self.initial = initial
+        self.logger = logger
+        self.retry_interval = retry_interval
+        self.request_timeout = request_timeout
+        self.listening = False
+        self.connections = 0
+        self._loop = None
+        self._changed = None
+
+    def start(self):
+        threading.Thread(target=asyncio.run, args=(self._serve(),), name='event-stream', daemon=True).start()
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self.broadcaster.add_listener(self._notify)
+        while True:
+            try:
+                server = await asyncio.start_server(self._handle, self.host, self.port)
+            except OSError as e:
+                if self.logger is not None:
+                    self.logger.info(f"事件流端口 {self.port} 暂不可用（可能由其他工作进程监听），稍后重试: {str(e)}")
+                await asyncio.sleep(self.retry_interval)
+                continue
+            self.listening = True
+            if self.logger is not None:
+                self.logger.info(f"事件流服务已在端口 {self.port} 上监听")
+            async with server:
+                await server.serve_forever()
+
+    def _notify(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        # 唤醒所有等待中的连接，之后的等待使用新的Event
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _read_request(self, reader):
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.request_timeout)
+        lines = head.decode('latin-1').split('\r\n')
+        method, target = lines[0].split(' ')[:2]
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        return method, target.split('?', 1)[0], headers
+
+    async def _handle(self, reader, writer):
+        subscribed = False
+        self.connections += 1
+        try:
+            try:
+                method, path, headers = await self._read_request(reader)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+                return
+            if method == 'OPTIONS':
+                writer.write(_http_head('204 No Content', {
+                    'Access-Control-Allow-Methods': 'GET',
+                    'Access-Control-Allow-Headers': 'Last-Event-ID, Cache-Control',
+                    'Access-Control-Max-Age': '86400'
+                }))
+                return
+            if method != 'GET' or path != self.path:
+                writer.write(_http_head('404 Not Found'))
+                return
+            if not self.broadcaster._reserve():
+                if self.logger is not None:
+                    self.logger.warning("事件订阅数已达上限，拒绝新的订阅")
+                writer.write(_http_head('503 Service Unavailable', {'Retry-After': '30'}))
+                return
+            subscribed = True
+
+            try:
+                last_event_id = int(headers['last-event-id'])
+            except (KeyError, ValueError):
+                last_event_id = None
+            cursor, backlog = self.broadcaster._backlog(last_event_id)
+            writer.write(_http_head('200 OK', {
+                'Content-Type': 'text/event-stream; charset=utf-8',
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }))
+            writer.write(RETRY_FRAME.encode('utf-8'))
+            if self.initial is not None:
+                event, data = self.initial()
+                writer.write(_format(None, event, json.dumps(data, ensure_ascii=False)).encode('utf-8'))
+
+            while True:
+                for sequence, event, data in backlog:
+                    cursor = sequence
+                    writer.write(_format(sequence, event, data).encode('utf-8'))
+                # 客户端长时间不读取时断开，避免待发送数据无限堆积
+                await asyncio.wait_for(writer.drain(), self.broadcaster.heartbeat)
+                changed = self._changed
+                if not self.broadcaster.closed and self.broadcaster.sequence == cursor:
+                    try:
+                        await asyncio.wait_for(changed.wait(), self.broadcaster.heartbeat)
+                    except asyncio.TimeoutError:
+                        pass
+                if self.broadcaster.closed:
+                    return
+                backlog = self.broadcaster._events_after(cursor)
+                if not backlog:
+                    writer.write(HEARTBEAT_FRAME.encode('utf-8'))
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.connections -= 1
+            if subscribed:
+                self.broadcaster._unsubscribe()
+            writer.close()
+
+    def stats(self):
+        return {'port': self.port, 'listening': self.listening, 'connections': self.connections}
+
+
+def _http_head(status, headers=None):
+    # 事件流响应不带Content-Length，以关闭连接结束；页面经重定向跨端口访问，因此允许任意来源
+    lines = [f"HTTP/1.1 {status}", 'Connection: close', 'Access-Control-Allow-Origin: *']
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    if not status.startswith('200'):
+        lines.append('Content-Length: 0')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+def _format(sequence, event, data):
+    lines = []
+    if sequence is not None:
+        lines.append(f"id: {sequence}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,220 @@
+import pandas as pd
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+from datetime import datetime
+
+# 输出目录与文件，与本脚本放在同一目录
+base_dir = os.path.dirname(os.path.abspath(__file__))
+archive_dir = os.path.join(base_dir, 'isolates')
+stats_path = os.path.join(base_dir, 'isolate_stats.json')
+
+# 每次读取的行数，决定单个分块的内存占用
+DEFAULT_CHUNK_SIZE = 100000
+
+# 输入CSV的列名
+COLUMNS = {
+    'organism': 'organism',
+    'drug': 'drug',
+    'result': 'result',
+    'date': 'date',
+    'ward': 'ward'
+}
+
+# 结果列只保留S/I/R三种判读
+RESULTS = ('S', 'I', 'R')
+
+# 缺少病区时使用的名称
+UNKNOWN_WARD = '未知'
+
+# 计算文件哈希时每次读取的字节数
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# 写入Parquet归档可用的引擎，pandas需要其中之一
+PARQUET_ENGINES = ('pyarrow', 'fastparquet')
+
+def load_stats():
+    """
+    读取已有的累计计数，不存在时返回空结构
+    """
+    if not os.path.exists(stats_path):
+        return {"ingested_files": [], "counters": {}}
+
+    with open(stats_path, 'r', encoding='utf-8') as f:
+        stored = json.load(f)
+
+    # 文件中按行存储 [细菌, 药物, 病区, 月份, S, I, R]，内存中按元组键合并
+    counters = {}
+    for organism, drug, ward, month, s, i, r in stored.get("counters", []):
+        counters[(organism, drug, ward, month)] = [s, i, r]
+    return {"ingested_files": stored.get("ingested_files", []), "counters": counters}
+
+def save_stats(stats):
+    """
+    原子写入累计计数：先写临时文件再替换，避免服务端读到半个文件
+    """
+    rows = [list(key) + counts for key, counts in sorted(stats["counters"].items())]
+    output = {
+        "updated_at": datetime.now().isoformat(),
+        "ingested_files": stats["ingested_files"],
+        "counters": rows
+    }
+    tmp_path = stats_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False)
+    os.replace(tmp_path, stats_path)
+
+def file_digests(csv_path, offsets=()):
+    """
+    流式计算文件内容的SHA-256，返回 (整个文件的哈希, 文件字节数, {偏移: 该偏移之前内容的哈希})
+    """
+    sha = hashlib.sha256()
+    prefixes = {}
+    position = 0
+    with open(csv_path, 'rb') as f:
+        for offset in sorted(set(offsets)) + [None]:
+            while offset is None or position < offset:
+                block = f.read(HASH_BLOCK_SIZE if offset is None else min(HASH_BLOCK_SIZE, offset - position))
+                if not block:
+                    break
+                sha.update(block)
+                position += len(block)
+            if offset is not None and position == offset:
+                prefixes[offset] = sha.hexdigest()
+    return sha.hexdigest(), position, prefixes
+
+def find_ingested(csv_path, ingested):
+    """
+    按文件内容（而不是路径和修改时间）判断已导入的部分，返回 (文件哈希, 文件字节数, 已导入的字节数)：
+    内容与已导入的某个文件完全相同（包括复制到其他路径）时已导入的字节数等于文件大小；
+    文件开头与已导入的某个文件完全相同（导出文件被追加）时只需导入其后的新增内容
+    """
+    # 旧版本按 路径|大小|修改时间 记录的字符串无法与内容比较，忽略
+    entries = [entry for entry in ingested if isinstance(entry, dict)]
+    digest, size, prefixes = file_digests(csv_path, [entry['bytes'] for entry in entries])
+    offset = 0
+    for entry in entries:
+        if prefixes.get(entry['bytes']) == entry['sha256']:
+            offset = max(offset, entry['bytes'])
+    return digest, size, offset
+
+def read_chunks(csv_path, offset, chunk_size, encoding):
+    """
+    从字节偏移offset开始分块读取CSV；offset>0时沿用文件第一行的列名
+    """
+    if offset == 0:
+        yield from pd.read_csv(csv_path, chunksize=chunk_size, dtype=str, encoding=encoding,
+                               usecols=list(COLUMNS.values()))
+        return
+
+    names = list(pd.read_csv(csv_path, nrows=0, encoding=encoding).columns)
+    with open(csv_path, 'rb') as f:
+        f.seek(offset)
+        yield from pd.read_csv(f, chunksize=chunk_size, dtype=str, encoding=encoding, header=None,
+                               names=names, usecols=list(COLUMNS.values()))
+
+def parquet_engine():
+    """
+    返回已安装的Parquet引擎名称，都未安装时返回None
+    """
+    for name in PARQUET_ENGINES:
+        if importlib.util.find_spec(name) is not None:
+            return name
+    return None
+
+def normalize_chunk(chunk):
+    """
+    清洗一个分块：统一列名、判读结果、病区，并将日期转换为月份
+    """
+    chunk = chunk.rename(columns={source: target for target, source in COLUMNS.items()})
+    chunk = chunk[list(COLUMNS.keys())].copy()
+
+    chunk['organism'] = chunk['organism'].astype(str).str.strip()
+    chunk['drug'] = chunk['drug'].astype(str).str.strip()
+    chunk['result'] = chunk['result'].astype(str).str.strip().str.upper().str[:1]
+    chunk['ward'] = chunk['ward'].fillna(UNKNOWN_WARD).astype(str).str.strip()
+    chunk['month'] = pd.to_datetime(chunk['date'], errors='coerce').dt.strftime('%Y-%m')
+
+    # 丢弃无法识别判读结果或日期的行
+    valid = chunk['result'].isin(RESULTS) & chunk['month'].notna() & (chunk['organism'] != '') & (chunk['drug'] != '')
+    return chunk[valid]
+
+def count_chunk(chunk, counters):
+    """
+    按(细菌, 药物, 病区, 月份)统计S/I/R数量并累加到计数器
+    """
+    grouped = chunk.groupby(['organism', 'drug', 'ward', 'month', 'result']).size()
+    for (organism, drug, ward, month, result), count in grouped.items():
+        counts = counters.setdefault((organism, drug, ward, month), [0, 0, 0])
+        counts[RESULTS.index(result)] += int(count)
+
+def archive_chunk(chunk, csv_path, digest, chunk_idx):
+    """
+    以列式格式（Parquet）归档清洗后的分块，便于后续离线分析；
+    文件名包含输入内容的哈希，同名的新导出文件不会覆盖之前的归档
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    part_path = os.path.join(archive_dir, f"{stem}-{digest[:12]}-part-{chunk_idx:05d}.parquet")
+    chunk[['organism', 'drug', 'result', 'month', 'ward', 'date']].astype(str).to_parquet(part_path, index=False)
+
+def ingest_isolates(csv_paths, chunk_size=DEFAULT_CHUNK_SIZE, archive=False, encoding='utf-8'):
+    """
+    分块读取药敏结果CSV，增量更新累计计数；内存占用只与分块大小和计数键的数量有关。
+    已导入的文件按内容哈希记录，重复导入或复制到其他路径时跳过，追加了新行的文件只导入新增部分
+    """
+    try:
+        # 在计数之前检查归档依赖，避免导入到一半才失败
+        if archive and parquet_engine() is None:
+            raise RuntimeError(f"写入Parquet归档需要安装 {' 或 '.join(PARQUET_ENGINES)}，或不使用--archive")
+
+        stats = load_stats()
+
+        for csv_path in csv_paths:
+            digest, size, offset = find_ingested(csv_path, stats["ingested_files"])
+            if offset >= size:
+                print(f"跳过已导入的文件: {csv_path}")
+                continue
+            if offset:
+                print(f"文件已导入前 {offset} 字节，只导入新增内容: {csv_path}")
+
+            total_rows = 0
+            valid_rows = 0
+            for chunk_idx, chunk in enumerate(read_chunks(csv_path, offset, chunk_size, encoding)):
+                total_rows += len(chunk)
+                chunk = normalize_chunk(chunk)
+                valid_rows += len(chunk)
+                count_chunk(chunk, stats["counters"])
+                if archive:
+                    archive_chunk(chunk, csv_path, digest, chunk_idx)
+
+            stats["ingested_files"].append({
+                "path": os.path.abspath(csv_path),
+                "bytes": size,
+                "sha256": digest
+            })
+            # 每个文件导入完成后立即落盘，中途失败时已完成的文件不会重复计数
+            save_stats(stats)
+            print(f"已导入: {csv_path}，共 {total_rows} 行，有效 {valid_rows} 行")
+
+        print(f"累计计数已保存至: {stats_path}")
+        print(f"计数键数量: {len(stats['counters'])}")
+        return stats
+
+    except Exception as e:
+        print(f"导入过程中出错: {e}", file=sys.stderr)
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='导入本地微生物室药敏结果并更新累计计数')
+    parser.add_argument('csv_paths', nargs='+', help='药敏结果CSV文件，需包含organism, drug, result, date, ward列')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='每次读取的行数')
+    parser.add_argument('--encoding', default='utf-8', help='CSV文件编码')
+    parser.add_argument('--archive', action='store_true', help='同时写入Parquet列式归档文件（需要pyarrow或fastparquet）')
+    args = parser.parse_args()
+
+    result = ingest_isolates(args.csv_paths, chunk_size=args.chunk_size, archive=args.archive, encoding=args.encoding)
+    sys.exit(0 if result is not None else 1)
@@ -0,0 +1,119 @@
+import sys
+import threading
+import tracemalloc
+
+# 内存占用分析：对象的深度大小、进程RSS以及tracemalloc分配统计
+
+
+def deep_sizeof(obj, seen=None):
+    """递归计算对象及其引用对象的总大小（字节），同一对象只计算一次"""
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif isinstance(current, (str, bytes, int, float, bool, type(None))):
+            continue
+        else:
+            if hasattr(current, '__dict__'):
+                stack.append(current.__dict__)
+            for slot in getattr(type(current), '__slots__', ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total
+
+
+def process_rss():
+    """当前进程的常驻内存（字节）；无法获取时返回None"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        # Linux上ru_maxrss单位为KB，macOS上为字节；这里返回的是峰值而非当前值
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def _format_stat(stat):
+    frame = stat.traceback[0]
+    return {
+        'location': f"{frame.filename}:{frame.lineno}",
+        'size': stat.size,
+        'count': stat.count
+    }
+
+
+def _format_diff(stat):
+    frame = stat.traceback[0]
+    return {
+        'location': f"{frame.filename}:{frame.lineno}",
+        'size_diff': stat.size_diff,
+        'count_diff': stat.count_diff,
+        'size': stat.size
+    }
+
+
+class AllocationTracker:
+    """tracemalloc的开关与基准快照管理；跟踪本身有开销，只在需要时开启"""
+
+    def __init__(self):
+        self._baseline = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self):
+        with self._lock:
+            self._baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def snapshot(self):
+        """记录基准快照，之后的报告会给出相对于它的增量"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError('tracemalloc未开启')
+        with self._lock:
+            self._baseline = tracemalloc.take_snapshot()
+
+    def report(self, top=10):
+        if not tracemalloc.is_tracing():
+            return {'tracing': False}
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        result = {
+            'tracing': True,
+            'traced_current': current,
+            'traced_peak': peak,
+            'top_allocators': [_format_stat(stat) for stat in snapshot.statistics('lineno')[:top]]
+        }
+        with self._lock:
+            baseline = self._baseline
+        if baseline is not None:
+            result['diff_from_snapshot'] = [
+                _format_diff(stat) for stat in snapshot.compare_to(baseline, 'lineno')[:top]
+            ]
+        return result
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import re
+
+from storage import normalize_search_term
+
+# 院区覆盖层：各院区按本地处方集或耐药数据改写部分指南结论。
+# 每个院区一个稀疏的覆盖表 overlays/<院区>.json，只记录被改写的格子，查询时叠加在共享的基础数据之上，
+# 不复制整份数据集，每个院区只占用与覆盖条目数成正比的内存。文件格式：
+#   {"description": "说明", "overrides": {"细菌名称": {"药物名称": "不推荐", ...}, ...}}
+# 细菌名称须与指南中的细菌名称一致（忽略大小写和空白差异），或与名称中的一行（中文名或英文名）一致且只对应一种细菌；
+# 不做子串匹配，名称不唯一或多个条目对应到同一种细菌时整条忽略并在ignored中列出。药物名称须与指南中的药物名称一致
+
+# 院区名称取自文件名，只允许字母、数字、下划线和连字符，同时作为查询参数site的取值
+SITE_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class SiteOverlay:
+    """一个院区的覆盖表：{细菌: {药物: 结论}}，以及按药物索引的同一份数据"""
+
+    def __init__(self, site, overrides, version, description='', ignored=None):
+        self.site = site
+        self.overrides = overrides
+        self.version = version
+        self.description = description
+        # 无法对应到指南中细菌或药物的条目，供管理API查看
+        self.ignored = ignored or []
+        self.by_drug = {}
+        for bacteria, changes in overrides.items():
+            for drug, sensitivity in changes.items():
+                self.by_drug.setdefault(drug, {})[bacteria] = sensitivity
+
+    def override_count(self):
+        return sum(len(changes) for changes in self.overrides.values())
+
+    def info(self):
+        return {
+            'site': self.site,
+            'description': self.description,
+            'version': self.version,
+            'bacteria': len(self.overrides),
+            'overrides': self.override_count(),
+            'ignored': self.ignored
+        }
+
+
+def _normalize(name):
+    return ' '.join(normalize_search_term(name).split())
+
+
+def bacteria_resolver(names):
+    """
+    返回覆盖表细菌名称的解析函数 resolve(key) -> 候选名称列表：
+    先按规范化后的完整名称精确匹配，没有时按名称中的单独一行精确匹配，可能得到多个候选
+    """
+    full = {}
+    lines = {}
+    for name in names:
+        full.setdefault(_normalize(name), []).append(name)
+        for line in name.split('\n'):
+            if line.strip():
+                lines.setdefault(_normalize(line), {})[name] = None
+
+    def resolve(key):
+        key = _normalize(key)
+        return full.get(key) or list(lines.get(key, {}))
+
+    return resolve
+
+
+def read_overlay(path, store):
+    """读取一个院区的覆盖文件，并将其中的细菌、药物名称对应到store中的名称"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    content = json.loads(raw.decode('utf-8'))
+    site = os.path.splitext(os.path.basename(path))[0]
+
+    resolve = bacteria_resolver(store.bacteria_names())
+    drug_names = set(store.drug_names())
+    ignored = []
+    resolved = {}
+    for name, changes in (content.get('overrides') or {}).items():
+        if not isinstance(changes, dict):
+            ignored.append({'bacteria': name, 'reason': '格式错误'})
+            continue
+        candidates = resolve(name)
+        if not candidates:
+            ignored.append({'bacteria': name, 'reason': '未找到该细菌'})
+        elif len(candidates) > 1:
+            ignored.append({'bacteria': name, 'reason': '名称不唯一', 'candidates': candidates})
+        else:
+            resolved.setdefault(candidates[0], []).append((name, changes))
+
+    overrides = {}
+    for bacteria, entries in resolved.items():
+        if len(entries) > 1:
+            keys = [name for name, _ in entries]
+            for name in keys:
+                ignored.append({'bacteria': name, 'reason': '多个条目对应到同一种细菌', 'target': bacteria,
+                                'conflicts': [key for key in keys if key != name]})
+            continue
+        name, changes = entries[0]
+        for drug, sensitivity in changes.items():
+            if drug not in drug_names:
+                ignored.append({'bacteria': name, 'drug': drug, 'reason': '未找到该药物'})
+            elif not isinstance(sensitivity, str) or not sensitivity.strip():
+                ignored.append({'bacteria': name, 'drug': drug, 'reason': '结论必须为非空字符串'})
+            else:
+                overrides.setdefault(bacteria, {})[drug] = sensitivity.strip()
+
+    # 版本标识取文件内容的哈希，覆盖表修改后缓存键随之变化
+    version = hashlib.sha1(raw).hexdigest()[:8]
+    return SiteOverlay(site, overrides, version, content.get('description', ''), ignored)
+
+
+def load_overlays(directory, store, logger):
+    """读取目录中所有院区的覆盖文件，返回 {院区: SiteOverlay}；单个文件出错时跳过该院区"""
+    overlays = {}
+    if not os.path.isdir(directory):
+        return overlays
+    for file_name in sorted(os.listdir(directory)):
+        site, ext = os.path.splitext(file_name)
+        if ext != '.json':
+            continue
+        if not SITE_NAME.match(site):
+            logger.warning(f"院区名称只能包含字母、数字、下划线和连字符，跳过覆盖文件: {file_name}")
+            continue
+        try:
+            overlay = read_overlay(os.path.join(directory, file_name), store)
+        except Exception as e:
+            logger.error(f"读取院区覆盖文件 {file_name} 时出错: {str(e)}")
+            continue
+        if overlay.ignored:
+            logger.warning(f"院区 '{site}' 的覆盖文件中有 {len(overlay.ignored)} 个条目无法对应到指南数据，已忽略")
+        overlays[site] = overlay
+    return overlays
+
+
+class OverlayStore:
+    """基础数据存储叠加一个院区覆盖层后的只读视图
+
+    与JsonStore/SqliteStore提供相同的查询接口。只有被覆盖的记录在查询时复制并改写，
+    其余记录和名称列表等直接返回基础数据，视图本身不持有数据，可以按请求随时创建。
+    """
+
+    def __init__(self, base, overlay):
+        self.base = base
+        self.overlay = overlay
+
+    def __getattr__(self, name):
+        # 名称列表、分类等不受覆盖影响的接口直接使用基础数据
+        return getattr(self.base, name)
+
+    def _apply(self, record):
+        changes = self.overlay.overrides.get(record.get('bacteria', '')) if record is not None else None
+        if not changes:
+            return record
+        antibiotics = dict(record.get('antibiotics', {}))
+        antibiotics.update(changes)
+        return dict(record, antibiotics=antibiotics)
+
+    def get_record(self, index):
+        return self._apply(self.base.get_record(index))
+
+    def find_bacteria(self, term):
+        return self._apply(self.base.find_bacteria(term))
+
+    def iter_records(self):
+        for record in self.base.iter_records():
+            yield self._apply(record)
+
+    def drug_results(self, drug_name):
+        results = self.base.drug_results(drug_name)
+        changes = self.overlay.by_drug.get(drug_name)
+        if not changes or results is None:
+            return results
+        return [
+            dict(item, sensitivity=changes[item['bacteria']]) if item['bacteria'] in changes else item
+            for item in results
+        ]
+
+    def changed_cells(self):
+        """覆盖后结论与基础数据不同的格子：[(细菌, 药物, 原结论, 新结论)]，基础数据中缺失的格子按"未知"计"""
+        cells = []
+        for record in self.base.iter_records():
+            changes = self.overlay.overrides.get(record.get('bacteria', ''))
+            if not changes:
+                continue
+            antibiotics = record.get('antibiotics', {})
+            for drug, sensitivity in changes.items():
+                previous = antibiotics.get(drug, '未知')
+                if previous != sensitivity:
+                    cells.append((record.get('bacteria', ''), drug, previous, sensitivity))
+        return cells
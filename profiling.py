@@ -0,0 +1,205 @@
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# 按需的请求级性能剖析：对抽样的请求采集调用栈，输出可直接生成火焰图的折叠栈格式（collapsed stacks）
+
+# 路径中的数字ID归并为同一个路由，避免/api/drug/1、/api/drug/2各自统计
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+# 每个路由汇总中保留的热点函数数量
+TOP_FUNCTIONS = 20
+
+
+def route_key(path):
+    return _ID_SEGMENT.sub('/<int>', path)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class _StackSampler(threading.Thread):
+    """后台线程，按固定间隔采集目标线程的调用栈"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[';'.join(stack)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RequestProfiler:
+    """管理剖析开关、抽样比例、磁盘环形缓冲区和按路由的热点函数汇总"""
+
+    def __init__(self, output_dir, sample_rate=0.0, ring_size=50, interval=0.001):
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.ring_size = ring_size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._slots = {}
+        self._routes = {}
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def configure(self, sample_rate=None, ring_size=None, interval=None):
+        removed = []
+        with self._lock:
+            if sample_rate is not None:
+                self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+            if ring_size is not None:
+                ring_size = max(int(ring_size), 1)
+                # 缩小环形缓冲区时，超出新容量的槽位不会再被覆盖，连同文件一起删除
+                if ring_size < self.ring_size:
+                    removed = list(range(ring_size, self.ring_size))
+                    for slot in removed:
+                        self._slots.pop(slot, None)
+                self.ring_size = ring_size
+            if interval is not None:
+                self.interval = max(float(interval), 0.0001)
+        self._remove_files(removed)
+
+    def _remove_files(self, slots):
+        for slot in slots:
+            try:
+                os.remove(self.slot_path(slot))
+            except FileNotFoundError:
+                continue
+
+    def should_sample(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def profile(self, path, fn):
+        """在采样状态下执行fn，返回fn的结果"""
+        sampler = _StackSampler(threading.get_ident(), self.interval)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            duration = time.perf_counter() - started
+            sampler.stop()
+            self._record(route_key(path), path, duration, sampler.stacks)
+
+    def _record(self, route, path, duration, stacks):
+        with self._lock:
+            slot = self._sequence % self.ring_size
+            self._sequence += 1
+
+            summary = self._routes.setdefault(route, {
+                'requests': 0, 'samples': 0, 'total_seconds': 0.0,
+                'self': Counter(), 'inclusive': Counter()
+            })
+            summary['requests'] += 1
+            summary['total_seconds'] += duration
+            for stack, count in stacks.items():
+                frames = stack.split(';')
+                summary['samples'] += count
+                summary['self'][frames[-1]] += count
+                for label in set(frames):
+                    summary['inclusive'][label] += count
+
+            self._slots[slot] = {
+                'slot': slot,
+                'route': route,
+                'path': path,
+                'duration_ms': round(duration * 1000, 2),
+                'samples': sum(stacks.values()),
+                'timestamp': datetime.now().isoformat()
+            }
+
+        # 环形缓冲区：固定数量的文件，新的剖析结果覆盖最旧的槽位
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = self.slot_path(slot) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(tmp_path, self.slot_path(slot))
+
+    def slot_path(self, slot):
+        return os.path.join(self.output_dir, f"profile-{slot:03d}.folded")
+
+    def recent(self):
+        with self._lock:
+            return sorted(self._slots.values(), key=lambda item: item['timestamp'], reverse=True)
+
+    def has_slot(self, slot):
+        with self._lock:
+            return slot in self._slots
+
+    def summary(self):
+        with self._lock:
+            routes = {}
+            for route, summary in self._routes.items():
+                samples = summary['samples'] or 1
+                routes[route] = {
+                    'requests': summary['requests'],
+                    'samples': summary['samples'],
+                    'avg_ms': round(summary['total_seconds'] * 1000 / summary['requests'], 2),
+                    'hot_self': [
+                        {'function': label, 'samples': count, 'percent': round(count * 100.0 / samples, 1)}
+                        for label, count in summary['self'].most_common(TOP_FUNCTIONS)
+                    ],
+                    'hot_inclusive': [
+                        {'function': label, 'samples': count, 'percent': round(count * 100.0 / samples, 1)}
+                        for label, count in summary['inclusive'].most_common(TOP_FUNCTIONS)
+                    ]
+                }
+            return routes
+
+    def reset(self):
+        """清空路由汇总和环形缓冲区中的全部剖析结果"""
+        with self._lock:
+            self._routes = {}
+            removed = list(range(self.ring_size))
+            self._slots = {}
+            self._sequence = 0
+        self._remove_files(removed)
+
+
+class ProfilingMiddleware:
+    """WSGI中间件：未启用剖析且未携带剖析请求头时直接调用下层应用，不产生额外开销
+
+    admin_check(environ) 用于校验强制剖析请求头（X-Profile）的管理员权限。
+    """
+
+    def __init__(self, wsgi_app, profiler, admin_check):
+        self.wsgi_app = wsgi_app
+        self.profiler = profiler
+        self.admin_check = admin_check
+
+    def __call__(self, environ, start_response):
+        sampled = self.profiler.should_sample()
+        if not sampled and environ.get('HTTP_X_PROFILE') == '1':
+            sampled = self.admin_check(environ)
+        if not sampled:
+            return self.wsgi_app(environ, start_response)
+        return self.profiler.profile(environ.get('PATH_INFO', ''),
+                                     lambda: self.wsgi_app(environ, start_response))
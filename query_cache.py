@@ -0,0 +1,155 @@
+import threading
+from collections import OrderedDict
+
+# 查询结果缓存与请求合并：相同的查询同一时间只计算一次，结果写入缓存供后续请求复用
+
+
+class LRUCache:
+    """线程安全的LRU缓存，超过容量时淘汰最久未使用的条目"""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        """读取但不更新命中统计和使用顺序"""
+        with self._lock:
+            return self._items.get(key, default)
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+    def items_snapshot(self):
+        """当前全部条目的副本 {键: 值}，按从最久未使用到最近使用的顺序"""
+        with self._lock:
+            return dict(self._items)
+
+    def stats(self):
+        return {'size': len(self._items), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+
+class _Call:
+    """一次正在进行的计算，等待者在event上阻塞直到结果就绪"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """相同key的并发调用只执行一次fn，其余调用等待并共享同一个结果（或异常）"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """返回 (结果, 是否为共享结果)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+    def in_flight(self):
+        return len(self._calls)
+
+
+class QueryCache:
+    """先查缓存，未命中时通过SingleFlight计算，计算结果写回缓存
+
+    shared为可选的第二级缓存（跨进程共享，需提供get/set/clear/stats），进程内缓存未命中时先查它再计算。
+    """
+
+    def __init__(self, max_size=1024, shared=None):
+        self.cache = LRUCache(max_size)
+        self.flight = SingleFlight()
+        self.shared = shared
+
+    def get_or_compute(self, key, fn):
+        missing = object()
+        value = self.cache.get(key, missing)
+        if value is not missing:
+            return value
+
+        def compute():
+            # 等待期间可能已有其他计算完成并写入缓存
+            cached = self.cache.peek(key, missing)
+            if cached is not missing:
+                return cached
+            if self.shared is not None:
+                cached = self.shared.get(key, missing)
+                if cached is not missing:
+                    self.cache.set(key, cached)
+                    return cached
+            result = fn()
+            self.cache.set(key, result)
+            if self.shared is not None:
+                self.shared.set(key, result)
+            return result
+
+        value, _ = self.flight.do(key, compute)
+        return value
+
+    def items_snapshot(self):
+        return self.cache.items_snapshot()
+
+    def clear(self):
+        """只清空进程内缓存；共享缓存的键包含数据版本，由其他进程继续使用或自然淘汰"""
+        self.cache.clear()
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats['coalesced'] = self.flight.coalesced
+        stats['in_flight'] = self.flight.in_flight()
+        if self.shared is not None:
+            stats['shared'] = self.shared.stats()
+        return stats
@@ -0,0 +1,275 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 影子验证：对抽样的线上请求，在后台线程用原始的线性扫描实现重新计算一次并与新实现的结果比对。
+# 下面的legacy_*函数逐行保留了改造前app.py中的匹配与排序逻辑，作为比对基准，不要"优化"它们。
+
+
+def legacy_search_bacteria(antibiotic_data, bacteria_name):
+    """原细菌搜索API：返回第一条匹配的记录，没有时返回None"""
+    # 转换搜索词为小写用于模糊匹配
+    search_term_lower = bacteria_name.lower()
+
+    # 在数据中查找对应的细菌，支持模糊匹配
+    for record in antibiotic_data.get('data', []):
+        record_bacteria = record.get('bacteria', '')
+        # 去除换行符并转换为小写进行比较
+        normalized_bacteria = record_bacteria.replace('\n', ' ').lower()
+        search_term_normalized = search_term_lower.replace('\n', ' ')
+
+        # 如果记录中的细菌名称包含搜索词，或者搜索词包含记录中的细菌名称（去除拉丁名部分）
+        if search_term_normalized in normalized_bacteria or normalized_bacteria.split(' ')[0] in search_term_normalized:
+            return record
+    return None
+
+
+def legacy_search_drug(antibiotic_data, drug_name):
+    """原药物搜索API：返回按细菌顺序排列的敏感性列表，没有时返回None"""
+    if 'drug_indexed' in antibiotic_data and drug_name in antibiotic_data['drug_indexed']:
+        return antibiotic_data['drug_indexed'][drug_name]
+
+    alternative_results = []
+    for record in antibiotic_data.get('data', []):
+        if drug_name in record.get('antibiotics', {}):
+            alternative_results.append({
+                'bacteria': record.get('bacteria'),
+                'sensitivity': record['antibiotics'][drug_name]
+            })
+    return alternative_results or None
+
+
+def legacy_compare_bacteria(antibiotic_data, bacteria_names):
+    """原细菌比较API：返回比较结果，找不到某个细菌时返回 {'missing_index': 序号}"""
+    results = {
+        'success': True,
+        'bacteria': [],
+        'comparison_data': []
+    }
+
+    all_drugs = set()
+    bacteria_data = {}
+    found_bacteria_names = []
+
+    for idx, bacteria_name in enumerate(bacteria_names):
+        search_term_lower = bacteria_name.lower()
+        found = False
+
+        for record in antibiotic_data.get('data', []):
+            record_bacteria = record.get('bacteria', '')
+            normalized_bacteria = record_bacteria.replace('\n', ' ').lower()
+
+            if search_term_lower in normalized_bacteria or normalized_bacteria.split(' ')[0] in search_term_lower:
+                bacteria_data[record_bacteria] = record.get('antibiotics', {})
+                found_bacteria_names.append(record_bacteria)
+                for drug in record.get('antibiotics', {}).keys():
+                    all_drugs.add(drug)
+                found = True
+                break
+
+        if not found:
+            return {'missing_index': idx}
+
+    results['bacteria'] = found_bacteria_names
+
+    for drug in antibiotic_data.get('drug_list', []):
+        if drug in all_drugs:
+            drug_data = {'drug': drug, 'bacteria_results': {}}
+            for bacteria in found_bacteria_names:
+                if bacteria in bacteria_data and drug in bacteria_data[bacteria]:
+                    drug_data['bacteria_results'][bacteria] = bacteria_data[bacteria][drug]
+                else:
+                    drug_data['bacteria_results'][bacteria] = '未知'
+            results['comparison_data'].append(drug_data)
+
+    return results
+
+
+def legacy_compare_drugs(antibiotic_data, drug_names):
+    """原药物比较API：返回比较结果"""
+    results = {
+        'success': True,
+        'drugs': drug_names,
+        'comparison_data': []
+    }
+
+    all_bacteria = set()
+
+    for drug_name in drug_names:
+        if 'drug_indexed' in antibiotic_data and drug_name in antibiotic_data['drug_indexed']:
+            for record in antibiotic_data['drug_indexed'][drug_name]:
+                all_bacteria.add(record['bacteria'])
+
+    for bacteria in antibiotic_data.get('bacteria_list', []):
+        if bacteria in all_bacteria:
+            bacteria_data = {'bacteria': bacteria, 'drug_results': {}}
+
+            for drug in drug_names:
+                bacteria_data['drug_results'][drug] = '未知'
+
+                if 'drug_indexed' in antibiotic_data and drug in antibiotic_data['drug_indexed']:
+                    for record in antibiotic_data['drug_indexed'][drug]:
+                        if record['bacteria'] == bacteria:
+                            bacteria_data['drug_results'][drug] = record['sensitivity']
+                            break
+
+                if bacteria_data['drug_results'][drug] == '未知':
+                    for record in antibiotic_data.get('data', []):
+                        if record.get('bacteria') == bacteria and drug in record.get('antibiotics', {}):
+                            bacteria_data['drug_results'][drug] = record['antibiotics'][drug]
+                            break
+
+            results['comparison_data'].append(bacteria_data)
+
+    return results
+
+
+class _RecordsView:
+    """可重复遍历的记录序列，每次遍历都从存储中逐条读取"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __iter__(self):
+        return iter(self.store.iter_records())
+
+
+class _DrugIndexView:
+    """按需查询的药物索引，与原始JSON中的drug_indexed一样包含药物列表中的每个药物"""
+
+    def __init__(self, store, drug_list):
+        self.store = store
+        self.drugs = set(drug_list)
+
+    def __contains__(self, drug):
+        return drug in self.drugs
+
+    def __getitem__(self, drug):
+        if drug not in self.drugs:
+            raise KeyError(drug)
+        return self.store.drug_results(drug) or []
+
+
+class StoreDataset:
+    """以原始JSON结构（data、drug_list、bacteria_list、drug_indexed）呈现一个数据存储，
+    供legacy_*函数使用；记录和药物索引都在访问时从存储读取，不在内存中物化整个数据集"""
+
+    def __init__(self, store):
+        drug_list = store.drug_names()
+        self._items = {
+            'bacteria_list': store.bacteria_names(),
+            'drug_list': drug_list,
+            'data': _RecordsView(store),
+            'drug_indexed': _DrugIndexView(store, drug_list)
+        }
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __getitem__(self, key):
+        return self._items[key]
+
+    def get(self, key, default=None):
+        return self._items.get(key, default)
+
+
+LEGACY_IMPLEMENTATIONS = {
+    'search_bacteria': legacy_search_bacteria,
+    'search_drug': legacy_search_drug,
+    'compare_bacteria': legacy_compare_bacteria,
+    'compare_drug': legacy_compare_drugs
+}
+
+
+class ShadowVerifier:
+    """抽样提交影子比对任务；后台队列已满时直接丢弃样本，不影响请求线程
+
+    dataset_provider(store) 返回store对应的原始JSON结构的数据集（data、drug_list、bacteria_list、drug_indexed），
+    供legacy_*函数使用。submit时传入处理该请求的存储，复核始终针对同一份数据，
+    抽样与复核之间重新加载数据不会造成误报。
+    new_ms为新实现实际查询的耗时；结果来自查询缓存时传入None，该样本照常比对结果，但不计入耗时对比。
+    """
+
+    def __init__(self, dataset_provider, logger, sample_rate=0.0, max_pending=16):
+        self.dataset_provider = dataset_provider
+        self.logger = logger
+        self.sample_rate = sample_rate
+        self._executor = None
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def configure(self, sample_rate):
+        self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+
+    def _route_metrics(self, route):
+        return self._metrics.setdefault(route, {
+            'sampled': 0, 'matched': 0, 'mismatched': 0, 'dropped': 0, 'errors': 0,
+            'timed': 0, 'new_ms_total': 0.0, 'legacy_ms_total': 0.0
+        })
+
+    def submit(self, route, args, new_result, new_ms, store):
+        """在请求线程中调用；未抽中时只做一次随机数比较"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return
+        if not self._pending.acquire(blocking=False):
+            with self._lock:
+                self._route_metrics(route)['dropped'] += 1
+            return
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+        self._executor.submit(self._verify, route, args, new_result, new_ms, store)
+
+    def _verify(self, route, args, new_result, new_ms, store):
+        try:
+            started = time.perf_counter()
+            legacy_result = LEGACY_IMPLEMENTATIONS[route](self.dataset_provider(store), args)
+            legacy_ms = (time.perf_counter() - started) * 1000
+            matched = legacy_result == new_result
+
+            with self._lock:
+                metrics = self._route_metrics(route)
+                metrics['sampled'] += 1
+                metrics['matched' if matched else 'mismatched'] += 1
+                if new_ms is not None:
+                    metrics['timed'] += 1
+                    metrics['new_ms_total'] += new_ms
+                    metrics['legacy_ms_total'] += legacy_ms
+
+            if matched:
+                new_label = f"{new_ms:.2f} ms" if new_ms is not None else '命中缓存'
+                self.logger.debug(f"影子验证一致: {route} {args!r} 新实现 {new_label}, 原实现 {legacy_ms:.2f} ms")
+            else:
+                self.logger.warning(
+                    f"影子验证不一致: {route} {args!r} 新实现结果 {str(new_result)[:300]} "
+                    f"原实现结果 {str(legacy_result)[:300]}")
+        except Exception as e:
+            with self._lock:
+                self._route_metrics(route)['errors'] += 1
+            self.logger.error(f"影子验证出错: {route} {args!r}: {str(e)}", exc_info=True)
+        finally:
+            self._pending.release()
+
+    def metrics(self):
+        with self._lock:
+            report = {}
+            for route, metrics in self._metrics.items():
+                item = dict(metrics)
+                # 平均耗时只统计新实现实际执行了查询的样本
+                timed = metrics['timed'] or 1
+                item['new_ms_avg'] = round(metrics['new_ms_total'] / timed, 3)
+                item['legacy_ms_avg'] = round(metrics['legacy_ms_total'] / timed, 3)
+                item['speedup'] = round(metrics['legacy_ms_total'] / metrics['new_ms_total'], 2) if metrics['new_ms_total'] else None
+                report[route] = item
+            return report
+
+    def reset(self):
+        with self._lock:
+            self._metrics = {}
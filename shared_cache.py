@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+# 同一主机上多个工作进程共享的查询结果缓存：每个条目一个JSON文件，先写临时文件再原子替换，
+# 读取方永远不会看到写了一半的文件；缓存键中已包含数据版本，数据更新后旧条目自然失效并按时间淘汰
+
+# 缓存条目格式版本：查询结果的结构或生成逻辑改变时加一，新旧代码并存（滚动部署）时互不读取对方的条目
+CACHE_SCHEMA_VERSION = 1
+
+
+class SharedDiskCache:
+    """磁盘上的共享缓存，作为进程内LRU缓存的第二级
+
+    条目总数超过max_entries时删除最旧的条目；每写入sweep_interval次检查一次，避免每次写入都遍历目录。
+    """
+
+    def __init__(self, directory, max_entries=10000, sweep_interval=200):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _versioned(self, key):
+        return [CACHE_SCHEMA_VERSION, key]
+
+    def _path(self, key):
+        digest = hashlib.sha1(json.dumps(self._versioned(key), ensure_ascii=False).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + '.json')
+
+    def get(self, key, default=None):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return default
+        except (OSError, ValueError):
+            self.errors += 1
+            return default
+        # 文件名是键的摘要，再核对一次完整的键以排除摘要冲突
+        if entry.get('key') != json.loads(json.dumps(self._versioned(key))):
+            self.misses += 1
+            return default
+        self.hits += 1
+        return entry['value']
+
+    def set(self, key, value):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 临时文件名包含进程和线程标识，多个写入方互不干扰
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'key': self._versioned(key), 'value': value}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError):
+            self.errors += 1
+            return
+
+        with self._lock:
+            self._writes += 1
+            sweep = self._writes % self.sweep_interval == 0
+        if sweep:
+            self.sweep()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json'):
+                    yield os.path.join(root, name)
+
+    def sweep(self):
+        """条目超过上限时按修改时间删除最旧的条目，删除到上限的90%"""
+        try:
+            entries = []
+            for path in self._entries():
+                try:
+                    entries.append((os.stat(path).st_mtime, path))
+                except FileNotFoundError:
+                    continue
+            if len(entries) <= self.max_entries:
+                return 0
+            entries.sort()
+            removed = 0
+            for _, path in entries[:len(entries) - int(self.max_entries * 0.9)]:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    continue
+            return removed
+        except OSError:
+            self.errors += 1
+            return 0
+
+    def clear(self):
+        for path in list(self._entries()):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+
+    def stats(self):
+        return {'directory': self.directory, 'max_entries': self.max_entries,
+                'hits': self.hits, 'misses': self.misses, 'errors': self.errors}
+
+
+def top_queries(log_paths, paths, limit, max_age=None):
+    """
+    从访问日志中统计成功请求次数最多的前limit个查询（路径+查询字符串）
+
+    日志每行为 时间戳\\t状态码\\t路径?查询字符串；只统计paths中的路由，max_age（秒）之前的记录忽略。
+    """
+    counts = Counter()
+    cutoff = time.time() - max_age if max_age else None
+    for log_path in log_paths:
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) != 3 or parts[1] != '200':
+                    continue
+                timestamp, _, url = parts
+                if url.split('?', 1)[0] not in paths:
+                    continue
+                if cutoff is not None:
+                    try:
+                        if float(timestamp) < cutoff:
+                            continue
+                    except ValueError:
+                        continue
+                counts[url] += 1
+    return [url for url, _ in counts.most_common(limit)]
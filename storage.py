@@ -0,0 +1,386 @@
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+
+# 数据存储后端：默认的内存JSON模式与可选的SQLite模式，对路由提供相同的查询接口
+
+def normalize_bacteria_name(name):
+    """细菌名称的搜索形式：换行替换为空格并转为小写"""
+    return name.replace('\n', ' ').lower()
+
+def normalize_search_term(term):
+    """搜索词的规范形式，与细菌搜索API保持一致"""
+    return term.lower().replace('\n', ' ')
+
+
+class JsonStore:
+    """内存JSON模式：整个数据集以convert_to_json.py生成的结构保存在内存中"""
+
+    backend = 'json'
+
+    def __init__(self, data, edition='default'):
+        self.data = data
+        self.edition = edition
+        self._records = data.get('data', [])
+        # 预先计算细菌名称的搜索形式，避免每次搜索重复转换
+        self._search_names = []
+        for record in self._records:
+            normalized = normalize_bacteria_name(record.get('bacteria', ''))
+            self._search_names.append((normalized, normalized.split(' ')[0], record))
+
+    @classmethod
+    def from_file(cls, json_path, edition='default'):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), edition)
+
+    def editions(self):
+        return [self.edition]
+
+    def bacteria_names(self):
+        return [record.get('bacteria', '') for record in self._records]
+
+    def drug_names(self):
+        if 'drug_list' in self.data:
+            return list(self.data['drug_list'])
+        # 旧格式数据没有drug_list时，从记录中收集
+        drug_set = set()
+        for record in self._records:
+            drug_set.update(record.get('antibiotics', {}).keys())
+        return sorted(drug_set)
+
+    def record_count(self):
+        return len(self._records)
+
+    def get_record(self, index):
+        if 0 <= index < len(self._records):
+            return self._records[index]
+        return None
+
+    def iter_records(self):
+        return iter(self._records)
+
+    def find_bacteria(self, term):
+        """按细菌搜索的匹配规则返回第一条匹配的记录：
+        记录名称包含搜索词，或搜索词包含记录名称的第一段"""
+        search_term_normalized = normalize_search_term(term)
+        for normalized, first_token, record in self._search_names:
+            if search_term_normalized in normalized or first_token in search_term_normalized:
+                return record
+        return None
+
+    def drug_results(self, drug_name):
+        """返回药物对各细菌的敏感性，按原始Excel中的细菌顺序；药物不存在时返回None"""
+        drug_indexed = self.data.get('drug_indexed')
+        if drug_indexed is not None and drug_name in drug_indexed:
+            return drug_indexed[drug_name]
+
+        results = []
+        for record in self._records:
+            if drug_name in record.get('antibiotics', {}):
+                results.append({
+                    'bacteria': record.get('bacteria'),
+                    'sensitivity': record['antibiotics'][drug_name]
+                })
+        return results or None
+
+    def drug_classes(self):
+        return self.data.get('drug_classes', {})
+
+    def bacteria_groups(self):
+        return self.data.get('bacteria_groups', {})
+
+    def sizeof_parts(self):
+        """内存中的各个数据结构 {名称: 对象}，供内存诊断统计大小"""
+        parts = dict(self.data)
+        parts['search_names'] = self._search_names
+        return parts
+
+    def close(self):
+        pass
+
+
+# SQLite模式的表结构：版本、细菌、药物、敏感性四张表，外加细菌名称的FTS5全文索引
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS editions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    source TEXT,
+    loaded_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bacteria (
+    id INTEGER PRIMARY KEY,
+    edition_id INTEGER NOT NULL REFERENCES editions(id),
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    search_name TEXT NOT NULL,
+    first_token TEXT NOT NULL,
+    bacteria_group TEXT
+);
+CREATE TABLE IF NOT EXISTS drugs (
+    id INTEGER PRIMARY KEY,
+    edition_id INTEGER NOT NULL REFERENCES editions(id),
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    drug_class TEXT
+);
+CREATE TABLE IF NOT EXISTS verdicts (
+    edition_id INTEGER NOT NULL,
+    bacteria_id INTEGER NOT NULL REFERENCES bacteria(id),
+    drug_id INTEGER NOT NULL REFERENCES drugs(id),
+    sensitivity TEXT NOT NULL,
+    PRIMARY KEY (edition_id, bacteria_id, drug_id)
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_bacteria_position ON bacteria(edition_id, position, id, name);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_drugs_position ON drugs(edition_id, position, id, name);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_drugs_name ON drugs(edition_id, name, id);
+CREATE INDEX IF NOT EXISTS idx_verdicts_drug ON verdicts(edition_id, drug_id, bacteria_id, sensitivity);
+"""
+
+# 细菌名称的trigram全文索引，支持任意子串匹配
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS bacteria_fts USING fts5(search_name, tokenize='trigram');
+"""
+
+# 查询语句保持为常量，sqlite3会在每个连接上缓存其预编译语句
+SQL_EDITION = "SELECT id FROM editions WHERE name = ?"
+SQL_LATEST_EDITION = "SELECT id, name FROM editions ORDER BY id DESC LIMIT 1"
+SQL_EDITIONS = "SELECT name FROM editions ORDER BY id"
+SQL_BACTERIA_NAMES = "SELECT name FROM bacteria WHERE edition_id = ? ORDER BY position"
+SQL_DRUG_NAMES = "SELECT name FROM drugs WHERE edition_id = ? ORDER BY position"
+SQL_BACTERIA_COUNT = "SELECT COUNT(*) FROM bacteria WHERE edition_id = ?"
+SQL_BACTERIA_AT = "SELECT id, name FROM bacteria WHERE edition_id = ? ORDER BY position LIMIT 1 OFFSET ?"
+SQL_BACTERIA_ALL = "SELECT id, name FROM bacteria WHERE edition_id = ? ORDER BY position"
+SQL_RECORD_VERDICTS = """
+SELECT d.name, v.sensitivity
+FROM verdicts v JOIN drugs d ON d.id = v.drug_id
+WHERE v.edition_id = ? AND v.bacteria_id = ?
+ORDER BY d.position
+"""
+SQL_FIND_BACTERIA_FTS = """
+SELECT id, name FROM bacteria
+WHERE edition_id = ? AND (
+    (id IN (SELECT rowid FROM bacteria_fts WHERE bacteria_fts MATCH ?) AND instr(search_name, ?) > 0)
+    OR instr(?, first_token) > 0
+)
+ORDER BY position LIMIT 1
+"""
+SQL_FIND_BACTERIA_SCAN = """
+SELECT id, name FROM bacteria
+WHERE edition_id = ? AND (instr(search_name, ?) > 0 OR instr(?, first_token) > 0)
+ORDER BY position LIMIT 1
+"""
+SQL_DRUG_ID = "SELECT id FROM drugs WHERE edition_id = ? AND name = ?"
+SQL_DRUG_RESULTS = """
+SELECT b.name, v.sensitivity
+FROM verdicts v JOIN bacteria b ON b.id = v.bacteria_id
+WHERE v.edition_id = ? AND v.drug_id = ?
+ORDER BY b.position
+"""
+SQL_DRUG_CLASSES = "SELECT drug_class, name FROM drugs WHERE edition_id = ? AND drug_class IS NOT NULL ORDER BY position"
+SQL_BACTERIA_GROUPS = "SELECT bacteria_group, name FROM bacteria WHERE edition_id = ? AND bacteria_group IS NOT NULL ORDER BY position"
+
+# trigram分词器只能匹配不少于3个字符的子串
+FTS_MIN_TERM_LENGTH = 3
+
+# 连接池中保留的空闲连接数上限
+DEFAULT_POOL_SIZE = 8
+
+
+class SqliteStore:
+    """SQLite模式：规范化表结构和覆盖索引，数据留在磁盘上，按需查询"""
+
+    backend = 'sqlite'
+
+    def __init__(self, db_path, edition=None, pool_size=DEFAULT_POOL_SIZE):
+        self.db_path = db_path
+        # 空闲的只读连接；查询时取出，用完放回，超过pool_size的连接在放回时关闭
+        self._pool = queue.LifoQueue(pool_size)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        if edition:
+            rows = self._query(SQL_EDITION, (edition,))
+            if not rows:
+                raise ValueError(f"数据库中不存在版本: {edition}")
+            self.edition_id, self.edition = rows[0][0], edition
+        else:
+            rows = self._query(SQL_LATEST_EDITION)
+            if not rows:
+                raise ValueError(f"数据库中没有任何版本: {db_path}")
+            self.edition_id, self.edition = rows[0]
+        self.has_fts = bool(self._query("SELECT 1 FROM sqlite_master WHERE name = 'bacteria_fts'"))
+
+    def _checkout(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            # 连接会在不同线程间传递，但同一时刻只被一个线程使用
+            return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, cached_statements=64,
+                                   check_same_thread=False)
+
+    def _checkin(self, conn):
+        with self._lock:
+            if not self._closed:
+                try:
+                    self._pool.put_nowait(conn)
+                    return
+                except queue.Full:
+                    pass
+        conn.close()
+
+    def _query(self, sql, params=()):
+        conn = self._checkout()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            self._checkin(conn)
+
+    def pool_stats(self):
+        return {'idle': self._pool.qsize(), 'max_idle': self._pool.maxsize, 'closed': self._closed}
+
+    def sizeof_parts(self):
+        """内存中的各个数据结构 {名称: 对象}；数据都在数据库文件中，内存里只有连接池"""
+        return {'connection_pool': self._pool}
+
+    def editions(self):
+        return [row[0] for row in self._query(SQL_EDITIONS)]
+
+    def bacteria_names(self):
+        return [row[0] for row in self._query(SQL_BACTERIA_NAMES, (self.edition_id,))]
+
+    def drug_names(self):
+        return [row[0] for row in self._query(SQL_DRUG_NAMES, (self.edition_id,))]
+
+    def record_count(self):
+        return self._query(SQL_BACTERIA_COUNT, (self.edition_id,))[0][0]
+
+    def _record(self, bacteria_id, name):
+        rows = self._query(SQL_RECORD_VERDICTS, (self.edition_id, bacteria_id))
+        return {'bacteria': name, 'antibiotics': {drug: sensitivity for drug, sensitivity in rows}}
+
+    def get_record(self, index):
+        if index < 0:
+            return None
+        rows = self._query(SQL_BACTERIA_AT, (self.edition_id, index))
+        return self._record(*rows[0]) if rows else None
+
+    def iter_records(self):
+        for bacteria_id, name in self._query(SQL_BACTERIA_ALL, (self.edition_id,)):
+            yield self._record(bacteria_id, name)
+
+    def find_bacteria(self, term):
+        """与JsonStore.find_bacteria的匹配规则和返回顺序一致"""
+        search_term_normalized = normalize_search_term(term)
+        if self.has_fts and len(search_term_normalized) >= FTS_MIN_TERM_LENGTH:
+            phrase = '"' + search_term_normalized.replace('"', '""') + '"'
+            rows = self._query(SQL_FIND_BACTERIA_FTS, (
+                self.edition_id, phrase, search_term_normalized, search_term_normalized))
+        else:
+            rows = self._query(SQL_FIND_BACTERIA_SCAN, (
+                self.edition_id, search_term_normalized, search_term_normalized))
+        return self._record(*rows[0]) if rows else None
+
+    def drug_results(self, drug_name):
+        row = self._query(SQL_DRUG_ID, (self.edition_id, drug_name))
+        if not row:
+            return None
+        rows = self._query(SQL_DRUG_RESULTS, (self.edition_id, row[0][0]))
+        return [{'bacteria': bacteria, 'sensitivity': sensitivity} for bacteria, sensitivity in rows]
+
+    def _groups(self, sql):
+        groups = {}
+        for group_name, name in self._query(sql, (self.edition_id,)):
+            groups.setdefault(group_name, []).append(name)
+        return groups
+
+    def drug_classes(self):
+        return self._groups(SQL_DRUG_CLASSES)
+
+    def bacteria_groups(self):
+        return self._groups(SQL_BACTERIA_GROUPS)
+
+    def close(self):
+        """关闭空闲连接；正在使用的连接在查询结束放回时关闭，因此可以在仍有进行中的请求时调用"""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def import_edition(db_path, json_path, edition):
+    """
+    将convert_to_json.py生成的JSON数据导入SQLite数据库；同名版本会被整体替换
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(SCHEMA)
+        try:
+            conn.executescript(FTS_SCHEMA)
+            has_fts = True
+        except sqlite3.OperationalError as e:
+            # 部分SQLite构建没有FTS5或trigram分词器，此时退回到全表扫描
+            print(f"FTS5不可用，细菌名称搜索将使用全表扫描: {e}")
+            has_fts = False
+
+        with conn:
+            row = conn.execute(SQL_EDITION, (edition,)).fetchone()
+            if row is not None:
+                old_id = row[0]
+                if has_fts:
+                    conn.execute("DELETE FROM bacteria_fts WHERE rowid IN (SELECT id FROM bacteria WHERE edition_id = ?)", (old_id,))
+                conn.execute("DELETE FROM verdicts WHERE edition_id = ?", (old_id,))
+                conn.execute("DELETE FROM bacteria WHERE edition_id = ?", (old_id,))
+                conn.execute("DELETE FROM drugs WHERE edition_id = ?", (old_id,))
+                conn.execute("DELETE FROM editions WHERE id = ?", (old_id,))
+
+            edition_id = conn.execute(
+                "INSERT INTO editions (name, source, loaded_at) VALUES (?, ?, ?)",
+                (edition, os.path.abspath(json_path), datetime.now().isoformat())).lastrowid
+
+            store = JsonStore(data, edition)
+            class_of = {drug: name for name, drugs in store.drug_classes().items() for drug in drugs}
+            group_of = {bacteria: name for name, members in store.bacteria_groups().items() for bacteria in members}
+
+            drug_ids = {}
+            for position, drug in enumerate(store.drug_names()):
+                drug_ids[drug] = conn.execute(
+                    "INSERT INTO drugs (edition_id, position, name, drug_class) VALUES (?, ?, ?, ?)",
+                    (edition_id, position, drug, class_of.get(drug))).lastrowid
+
+            for position, record in enumerate(store.iter_records()):
+                name = record.get('bacteria', '')
+                normalized = normalize_bacteria_name(name)
+                bacteria_id = conn.execute(
+                    "INSERT INTO bacteria (edition_id, position, name, search_name, first_token, bacteria_group) VALUES (?, ?, ?, ?, ?, ?)",
+                    (edition_id, position, name, normalized, normalized.split(' ')[0], group_of.get(name))).lastrowid
+                if has_fts:
+                    conn.execute("INSERT INTO bacteria_fts (rowid, search_name) VALUES (?, ?)", (bacteria_id, normalized))
+                conn.executemany(
+                    "INSERT INTO verdicts (edition_id, bacteria_id, drug_id, sensitivity) VALUES (?, ?, ?, ?)",
+                    [(edition_id, bacteria_id, drug_ids[drug], sensitivity)
+                     for drug, sensitivity in record.get('antibiotics', {}).items() if drug in drug_ids])
+
+        conn.execute("ANALYZE")
+        print(f"版本 '{edition}' 已导入: {db_path}")
+        print(f"包含细菌种类数: {store.record_count()}, 药物种类数: {len(drug_ids)}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='将抗菌谱JSON数据导入SQLite数据库')
+    parser.add_argument('json_path', help='convert_to_json.py生成的JSON文件')
+    parser.add_argument('--db', default='antibiotic_data.db', help='SQLite数据库文件')
+    parser.add_argument('--edition', required=True, help='版本名称，例如 53')
+    args = parser.parse_args()
+
+    import_edition(args.db, args.json_path, args.edition)
@@ -0,0 +1,56 @@
+import copy
+import json
+import os
+
+import pytest
+
+from edition_changes import build_change_report, diff_editions, load_matrix
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+data_path = os.path.join(base_dir, 'antibiotic_data.json')
+
+pytestmark = pytest.mark.skipif(not os.path.exists(data_path), reason='未找到antibiotic_data.json')
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    with open(data_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_dataset(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    return str(path)
+
+
+def test_duplicated_row_is_reported(dataset, tmp_path):
+    data = copy.deepcopy(dataset)
+    data['data'].append(copy.deepcopy(data['data'][0]))
+    new_path = write_dataset(tmp_path / 'new.json', data)
+
+    with pytest.raises(ValueError, match='重复的细菌名称'):
+        load_matrix(new_path)
+    # 命令行入口据此以非零状态退出，且不写出报告
+    assert build_change_report(data_path, new_path, 'old', 'new') is None
+
+
+def test_renamed_row_is_aligned(dataset, tmp_path):
+    data = copy.deepcopy(dataset)
+    record = data['data'][1]
+    old_name = record['bacteria']
+    drug = data['drug_list'][0]
+    old_verdict = record['antibiotics'].get(drug, '未知')
+    record['bacteria'] = old_name + '（新版）'
+    record['antibiotics'][drug] = '变化后的结论'
+    new_path = write_dataset(tmp_path / 'new.json', data)
+
+    report = diff_editions(load_matrix(data_path), load_matrix(new_path),
+                           bacteria_aliases={old_name: record['bacteria']})
+    assert report['renamed']['bacteria'] == {old_name: record['bacteria']}
+    assert report['added']['bacteria'] == [] and report['removed']['bacteria'] == []
+    assert report['cells_compared'] == len(data['data']) * len(data['drug_list'])
+
+    changes = [(report['bacteria'][row], report['drugs'][col], report['verdicts'][old], report['verdicts'][new])
+               for row, col, old, new in report['changes']]
+    assert changes == [(record['bacteria'], drug, old_verdict, '变化后的结论')]
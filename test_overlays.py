@@ -0,0 +1,57 @@
+import json
+import os
+
+import pytest
+
+from overlays import read_overlay
+from storage import JsonStore
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+data_path = os.path.join(base_dir, 'antibiotic_data.json')
+
+pytestmark = pytest.mark.skipif(not os.path.exists(data_path), reason='未找到antibiotic_data.json')
+
+
+@pytest.fixture(scope='module')
+def store():
+    return JsonStore.from_file(data_path, 'test')
+
+
+def overlay_from(tmp_path, overrides):
+    path = tmp_path / 'site.json'
+    path.write_text(json.dumps({'overrides': overrides}, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+def test_exact_and_single_line_names(store, tmp_path):
+    drug = store.drug_names()[0]
+    overlay = read_overlay(overlay_from(tmp_path, {
+        'mrsa': {drug: '不推荐'},
+        '粪肠球菌(敏感)  e.faecalis': {drug: '不推荐'},
+        '路邓葡萄球菌': {drug: '不推荐'}
+    }), store)
+    assert sorted(overlay.overrides) == sorted(['MRSA', '粪肠球菌(敏感)\nE.faecalis', '路邓葡萄球菌\nS.lugdunensis'])
+    assert overlay.ignored == []
+
+
+def test_substrings_and_ambiguous_names_are_ignored(store, tmp_path):
+    drug = store.drug_names()[0]
+    overlay = read_overlay(overlay_from(tmp_path, {
+        '粪肠': {drug: '不推荐'},
+        'E.faecalis': {drug: '不推荐'}
+    }), store)
+    assert overlay.overrides == {}
+    reasons = {item['bacteria']: item for item in overlay.ignored}
+    assert reasons['粪肠']['reason'] == '未找到该细菌'
+    assert reasons['E.faecalis']['reason'] == '名称不唯一'
+    assert sorted(reasons['E.faecalis']['candidates']) == sorted(['粪肠球菌(敏感)\nE.faecalis', '粪肠球菌(VRE)\nE.faecalis'])
+
+
+def test_colliding_names_are_ignored(store, tmp_path):
+    drug = store.drug_names()[0]
+    overlay = read_overlay(overlay_from(tmp_path, {
+        'MRSA': {drug: '不推荐'},
+        'mrsa': {drug: '推荐'}
+    }), store)
+    assert overlay.overrides == {}
+    assert [item['reason'] for item in overlay.ignored] == ['多个条目对应到同一种细菌'] * 2
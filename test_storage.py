@@ -0,0 +1,78 @@
+import os
+import threading
+
+import pytest
+
+from storage import JsonStore, SqliteStore, import_edition
+
+# JSON与SQLite两种存储模式对同一份数据必须给出完全相同的查询结果
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+data_path = os.path.join(base_dir, 'antibiotic_data.json')
+
+pytestmark = pytest.mark.skipif(not os.path.exists(data_path), reason='未找到antibiotic_data.json')
+
+
+@pytest.fixture(scope='module')
+def stores(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp('storage') / 'antibiotic_data.db')
+    import_edition(db_path, data_path, 'test')
+    json_store = JsonStore.from_file(data_path, 'test')
+    sqlite_store = SqliteStore(db_path)
+    yield json_store, sqlite_store
+    sqlite_store.close()
+
+
+def test_lists_and_groups(stores):
+    json_store, sqlite_store = stores
+    assert sqlite_store.edition == json_store.edition
+    assert sqlite_store.bacteria_names() == json_store.bacteria_names()
+    assert sqlite_store.drug_names() == json_store.drug_names()
+    assert sqlite_store.record_count() == json_store.record_count()
+    assert sqlite_store.drug_classes() == json_store.drug_classes()
+    assert sqlite_store.bacteria_groups() == json_store.bacteria_groups()
+
+
+def test_records(stores):
+    json_store, sqlite_store = stores
+    assert list(sqlite_store.iter_records()) == list(json_store.iter_records())
+    for index in (-1, 0, json_store.record_count() - 1, json_store.record_count()):
+        assert sqlite_store.get_record(index) == json_store.get_record(index)
+
+
+def test_find_bacteria(stores):
+    json_store, sqlite_store = stores
+    terms = ['', 'a', 'zz', '不存在的细菌', 'E.FAECALIS', '"quoted"']
+    for name in json_store.bacteria_names():
+        # 完整名称、换行替换为空格的名称、第一段和其中的短子串
+        terms += [name, name.replace('\n', ' ').upper(), name.split('\n')[0], name[:2], name[1:4]]
+    for term in terms:
+        assert sqlite_store.find_bacteria(term) == json_store.find_bacteria(term), term
+
+
+def test_drug_results(stores):
+    json_store, sqlite_store = stores
+    for drug in json_store.drug_names() + ['不存在的药物']:
+        assert sqlite_store.drug_results(drug) == json_store.drug_results(drug), drug
+
+
+def test_connection_pool_is_bounded(stores):
+    _, sqlite_store = stores
+    threads = [threading.Thread(target=sqlite_store.record_count) for _ in range(200)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sqlite_store.pool_stats()['idle'] <= sqlite_store.pool_stats()['max_idle']
+
+
+def test_close_with_query_in_flight(tmp_path):
+    db_path = str(tmp_path / 'antibiotic_data.db')
+    import_edition(db_path, data_path, 'test')
+    store = SqliteStore(db_path)
+    records = store.iter_records()
+    first = next(records)
+    store.close()
+    # 关闭后进行中的查询仍能完成，连接用完即关闭而不再放回连接池
+    assert len([first] + list(records)) == store.record_count()
+    assert store.pool_stats()['idle'] == 0